@@ -0,0 +1,244 @@
+"""
+Classificador local (CPU) de anúncios ativos, treinado com os vereditos acumulados da OpenAI.
+
+Modelo: TF-IDF de palavras (unigramas e bigramas) + regressão logística (scikit-learn), treinado sobre
+os textos do `snapshot_store` rotulados pela OpenAI (ou manualmente). A inferência leva milissegundos;
+`verifications_streamlit.classify_ads` só recorre à OpenAI quando a confiança fica abaixo do limiar.
+scikit-learn é opcional: sem ele (ou sem modelo treinado) o fluxo continua apenas com a OpenAI.
+
+Uso:
+    python ad_classifier.py train
+    python ad_classifier.py evaluate --llm-sample 30 --output relatorio.json
+"""
+import os
+import time
+import pickle
+import importlib.util
+import random
+import logging
+import threading
+
+import snapshot_store
+
+logger = logging.getLogger(__name__)
+
+AD_CLASSIFIER_PATH = os.getenv("AD_CLASSIFIER_PATH", "ad_classifier.pkl")
+AD_CLASSIFIER_ENABLED = os.getenv("AD_CLASSIFIER_ENABLED", "true").lower() in ("1", "true", "sim", "yes")
+# Confiança mínima (probabilidade da classe prevista) para dispensar a OpenAI
+AD_CLASSIFIER_THRESHOLD = float(os.getenv("AD_CLASSIFIER_THRESHOLD", "0.9"))
+MIN_TRAINING_SAMPLES = 50
+MAX_CONTENT_LENGTH = 15800 # Mesmo recorte enviado à OpenAI
+
+_model_lock = threading.Lock()
+_model = None
+_model_loaded = False
+
+
+def _prepare_text(platform, conteudo):
+    # O token da plataforma permite que um único modelo aprenda padrões diferentes para Facebook e Google
+    return f"plataforma_{platform} {conteudo[:MAX_CONTENT_LENGTH]}"
+
+
+def _build_pipeline():
+    from sklearn.pipeline import Pipeline
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return Pipeline([
+        ("tfidf", TfidfVectorizer(ngram_range=(1, 2), min_df=2, max_features=50000, sublinear_tf=True, strip_accents="unicode")),
+        ("clf", LogisticRegression(max_iter=1000, class_weight="balanced")),
+    ])
+
+
+def _split(samples, test_size, seed):
+    """Separação treino/teste estratificada por rótulo, reprodutível pela semente."""
+    rng = random.Random(seed)
+    train, test = [], []
+    for label in (True, False):
+        group = [sample for sample in samples if sample["verdict"] == label]
+        rng.shuffle(group)
+        cut = int(round(len(group) * test_size))
+        test.extend(group[:cut])
+        train.extend(group[cut:])
+    return train, test
+
+
+def _fit(samples):
+    pipeline = _build_pipeline()
+    pipeline.fit([_prepare_text(s["platform"], s["text"]) for s in samples], [int(s["verdict"]) for s in samples])
+    return pipeline
+
+
+def train(model_path=None, min_samples=MIN_TRAINING_SAMPLES, db_path=None):
+    """Treina o modelo com todos os conteúdos rotulados e o grava em disco. Retorna um resumo do treino."""
+    samples = snapshot_store.labelled_pages(db_path=db_path)
+    positives = sum(1 for sample in samples if sample["verdict"])
+    if len(samples) < min_samples or positives == 0 or positives == len(samples):
+        raise ValueError(f"Dados insuficientes para treinar: {len(samples)} conteúdos rotulados ({positives} com anúncios ativos). "
+                         f"São necessários pelo menos {min_samples}, com exemplos das duas classes.")
+    started_at = time.monotonic()
+    pipeline = _fit(samples)
+    info = {
+        "trained_at": time.time(),
+        "samples": len(samples),
+        "positives": positives,
+        "training_seconds": round(time.monotonic() - started_at, 2),
+    }
+    with open(model_path or AD_CLASSIFIER_PATH, "wb") as model_file:
+        pickle.dump({"pipeline": pipeline, "info": info}, model_file)
+    reload_model()
+    logger.info(f"Classificador local treinado com {len(samples)} conteúdos em {info['training_seconds']}s.")
+    return info
+
+
+def load_model(model_path=None):
+    """Carrega o modelo do disco uma vez por processo. Retorna None se desativado, ausente ou sem scikit-learn."""
+    global _model, _model_loaded
+    if not AD_CLASSIFIER_ENABLED:
+        return None
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                path = model_path or AD_CLASSIFIER_PATH
+                if os.path.exists(path):
+                    try:
+                        with open(path, "rb") as model_file:
+                            _model = pickle.load(model_file)
+                        logger.info(f"Classificador local carregado de {path} ({_model['info']['samples']} amostras de treino).")
+                    except Exception as e:
+                        logger.warning(f"Não foi possível carregar o classificador local ({path}): {e}. Usando apenas a OpenAI.")
+                        _model = None
+                _model_loaded = True
+    return _model
+
+
+def reload_model():
+    global _model, _model_loaded
+    with _model_lock:
+        _model = None
+        _model_loaded = False
+    return load_model()
+
+
+def model_available():
+    """Indica se há um modelo treinado em disco e o scikit-learn instalado, sem carregar o modelo nem importar o scikit-learn."""
+    return AD_CLASSIFIER_ENABLED and os.path.exists(AD_CLASSIFIER_PATH) and importlib.util.find_spec("sklearn") is not None
+
+
+def predict(platform, conteudo):
+    """Retorna (tem_anuncios_ativos, confiança) pelo modelo local, ou None se não houver modelo."""
+    model = load_model()
+    if model is None:
+        return None
+    probabilities = model["pipeline"].predict_proba([_prepare_text(platform, conteudo)])[0]
+    classes = list(model["pipeline"].classes_)
+    positive = float(probabilities[classes.index(1)])
+    return positive >= 0.5, max(positive, 1 - positive)
+
+
+def evaluate(test_size=0.2, seed=42, threshold=None, llm_sample=0, db_path=None):
+    """
+    Relatório offline: treina em uma parte dos dados rotulados e compara, na parte separada, o modelo local
+    (acurácia, precisão, revocação, latência) com o caminho atual via OpenAI.
+
+    Com `llm_sample` > 0, esse número de conteúdos de teste é reenviado à OpenAI para medir a latência real
+    e a concordância com os rótulos armazenados. Essas respostas não são gravadas como novos rótulos.
+    """
+    threshold = AD_CLASSIFIER_THRESHOLD if threshold is None else threshold
+    samples = snapshot_store.labelled_pages(db_path=db_path)
+    train_samples, test_samples = _split(samples, test_size, seed)
+    positives = sum(1 for sample in train_samples if sample["verdict"])
+    if len(train_samples) < MIN_TRAINING_SAMPLES or not test_samples or positives == 0 or positives == len(train_samples):
+        raise ValueError(f"Dados insuficientes para avaliar: {len(samples)} conteúdos rotulados ({positives} com anúncios ativos na parte de treino). "
+                         f"São necessários pelo menos {MIN_TRAINING_SAMPLES} para treino, com exemplos das duas classes.")
+    pipeline = _fit(train_samples)
+    classes = list(pipeline.classes_)
+
+    latencies = []
+    outcomes = []
+    for sample in test_samples:
+        started_at = time.perf_counter()
+        positive = float(pipeline.predict_proba([_prepare_text(sample["platform"], sample["text"])])[0][classes.index(1)])
+        latencies.append((time.perf_counter() - started_at) * 1000)
+        outcomes.append((positive >= 0.5, max(positive, 1 - positive), sample["verdict"]))
+
+    def metrics(rows):
+        true_positive = sum(1 for predicted, _, actual in rows if predicted and actual)
+        false_positive = sum(1 for predicted, _, actual in rows if predicted and not actual)
+        false_negative = sum(1 for predicted, _, actual in rows if not predicted and actual)
+        correct = sum(1 for predicted, _, actual in rows if predicted == actual)
+        precision = true_positive / (true_positive + false_positive) if true_positive + false_positive else None
+        recall = true_positive / (true_positive + false_negative) if true_positive + false_negative else None
+        return {
+            "samples": len(rows),
+            "accuracy": round(correct / len(rows), 4) if rows else None,
+            "precision": round(precision, 4) if precision is not None else None,
+            "recall": round(recall, 4) if recall is not None else None,
+        }
+
+    latencies.sort()
+    confident = [row for row in outcomes if row[1] >= threshold]
+    report = {
+        "generated_at": time.time(),
+        "labelled_samples": len(samples),
+        "train_samples": len(train_samples),
+        "test_samples": len(test_samples),
+        "local": {
+            **metrics(outcomes),
+            "latency_ms_mean": round(sum(latencies) / len(latencies), 2),
+            "latency_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        },
+        "hybrid": {
+            "threshold": threshold,
+            "local_coverage": round(len(confident) / len(outcomes), 4),
+            "local_when_confident": metrics(confident),
+            "openai_calls_avoided_pct": round(100 * len(confident) / len(outcomes), 1),
+        },
+        "openai": None,
+    }
+
+    if llm_sample:
+        from verifications_streamlit import analyze_ads_with_openai_api
+
+        sample = random.Random(seed).sample(test_samples, min(llm_sample, len(test_samples)))
+        llm_latencies = []
+        agreements = 0
+        for item in sample:
+            started_at = time.perf_counter()
+            verdict = analyze_ads_with_openai_api(item["platform"], item["text"], item["query"], record=False)
+            llm_latencies.append((time.perf_counter() - started_at) * 1000)
+            agreements += int(verdict == item["verdict"])
+        llm_latencies.sort()
+        report["openai"] = {
+            "samples": len(sample),
+            "agreement_with_labels": round(agreements / len(sample), 4),
+            "latency_ms_mean": round(sum(llm_latencies) / len(llm_latencies), 1),
+            "latency_ms_p95": round(llm_latencies[int(0.95 * (len(llm_latencies) - 1))], 1),
+        }
+    return report
+
+
+if __name__ == '__main__':
+    import json
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Classificador local de anúncios ativos.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train_parser = sub.add_parser("train", help="Treina o modelo com os conteúdos rotulados do snapshot_store.")
+    train_parser.add_argument("--min-samples", type=int, default=MIN_TRAINING_SAMPLES)
+    eval_parser = sub.add_parser("evaluate", help="Gera o relatório comparativo modelo local x OpenAI.")
+    eval_parser.add_argument("--test-size", type=float, default=0.2)
+    eval_parser.add_argument("--threshold", type=float, default=AD_CLASSIFIER_THRESHOLD)
+    eval_parser.add_argument("--llm-sample", type=int, default=0, help="Quantos conteúdos de teste reenviar à OpenAI (0 = não chamar).")
+    eval_parser.add_argument("--output", help="Arquivo JSON para gravar o relatório.")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        print(json.dumps(train(min_samples=args.min_samples), indent=2))
+    else:
+        evaluation = evaluate(test_size=args.test_size, threshold=args.threshold, llm_sample=args.llm_sample)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as report_file:
+                json.dump(evaluation, report_file, indent=2)
+        print(json.dumps(evaluation, indent=2))
@@ -0,0 +1,351 @@
+"""
+API HTTP para verificação e pontuação de leads, sem a interface Streamlit.
+
+Reaproveita `run_verification_tasks`, `calculate_score` e `determine_qualification`. Os leads são
+processados por um pool de workers com tamanho fixo; quando a fila está cheia a API responde
+429 com Retry-After. Envios com o mesmo cabeçalho Idempotency-Key retornam o mesmo job.
+
+Endpoints:
+    POST /v1/leads          um lead  -> 202 {"job_id": ...}
+    POST /v1/leads/batch    {"leads": [...]} -> 202 {"job_id": ...}
+    GET  /v1/jobs/<id>          status do job
+    GET  /v1/jobs/<id>/results  status e resultados (parciais enquanto o job roda)
+    GET  /health
+
+Formato de um lead:
+    {"instagram_username": "...", "domain": "...", "cnpj": "...",
+     "checklist": {"interesse_assessoria": true, ...}, "valor_inicial": 100.0, "valor_atual": 120.0,
+     "reuse_max_age_hours": 24}
+
+Uso:
+    python api_server.py --port 8080 --workers 2
+"""
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import lead_history
+from scoring import CRITERIA_POINTS, calculate_score, determine_qualification
+from verifications_streamlit import run_verification_tasks
+
+logger = logging.getLogger(__name__)
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+API_MAX_WORKERS = int(os.getenv("API_MAX_WORKERS", "2"))
+# Máximo de leads aguardando ou em execução antes de responder 429
+API_MAX_PENDING = int(os.getenv("API_MAX_PENDING", "50"))
+# Lotes maiores que a fila nunca caberiam nela: o limite efetivo é o menor dos dois
+API_MAX_BATCH_SIZE = min(int(os.getenv("API_MAX_BATCH_SIZE", str(API_MAX_PENDING))), API_MAX_PENDING)
+API_JOB_TTL_SECONDS = float(os.getenv("API_JOB_TTL_SECONDS", str(6 * 3600)))
+API_TOKEN = os.getenv("API_TOKEN")
+# Estimativa inicial da duração de um lead, usada no Retry-After até haver medições
+DEFAULT_LEAD_SECONDS = 60.0
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Fila de verificação cheia.")
+        self.retry_after = retry_after
+
+
+class IdempotencyConflictError(Exception):
+    pass
+
+
+class BatchTooLargeError(Exception):
+    def __init__(self, size, max_size):
+        super().__init__(f"Lote com {size} leads excede o máximo de {max_size}.")
+        self.max_size = max_size
+
+
+def validate_lead(lead):
+    """Valida e normaliza um lead recebido pela API. Lança ValueError com mensagem para o cliente."""
+    if not isinstance(lead, dict):
+        raise ValueError("Cada lead deve ser um objeto JSON.")
+    for key in ("instagram_username", "domain", "cnpj"):
+        if lead.get(key) is not None and not isinstance(lead[key], str):
+            raise ValueError(f"{key} deve ser uma string.")
+    instagram_username = (lead.get("instagram_username") or "").strip()
+    domain = (lead.get("domain") or "").strip()
+    cnpj = (lead.get("cnpj") or "").strip()
+    if not instagram_username and not domain and not cnpj:
+        raise ValueError("Forneça pelo menos instagram_username, domain ou cnpj.")
+    checklist = lead.get("checklist") or {}
+    if not isinstance(checklist, dict):
+        raise ValueError("checklist deve ser um objeto com chaves de critério e valores booleanos.")
+    unknown = sorted(key for key in checklist if key not in CRITERIA_POINTS)
+    if unknown:
+        raise ValueError(f"Critérios desconhecidos no checklist: {', '.join(unknown)}")
+    # Aceita apenas true/false (ou 0/1): bool("false") seria True e daria pontos a critérios não marcados
+    invalid = sorted(key for key, value in checklist.items() if not (isinstance(value, bool) or (type(value) is int and value in (0, 1))))
+    if invalid:
+        raise ValueError(f"Valores do checklist devem ser booleanos (true/false ou 0/1): {', '.join(invalid)}")
+    try:
+        valor_inicial = float(lead.get("valor_inicial") or 0)
+        valor_atual = float(lead.get("valor_atual") or 0)
+        reuse_max_age_hours = float(lead["reuse_max_age_hours"]) if lead.get("reuse_max_age_hours") else None
+    except (TypeError, ValueError):
+        raise ValueError("valor_inicial, valor_atual e reuse_max_age_hours devem ser numéricos.")
+    return {
+        "instagram_username": instagram_username,
+        "domain": domain,
+        "cnpj": cnpj,
+        "checklist": {key: bool(value) for key, value in checklist.items()},
+        "valor_inicial": valor_inicial,
+        "valor_atual": valor_atual,
+        "reuse_max_age_hours": reuse_max_age_hours,
+    }
+
+
+def process_lead(lead):
+    """Verifica, pontua, qualifica e grava um lead no histórico. Mesmo fluxo do botão 'Analisar Lead Agora!'."""
+    previous = None
+    verification_results = None
+    if lead["reuse_max_age_hours"]:
+        # Mesmo critério do app: só reaproveita com todos os identificadores iguais
+        previous = lead_history.find_reusable(lead["instagram_username"], lead["domain"], lead["cnpj"],
+                                              max_age_hours=lead["reuse_max_age_hours"])
+        if previous:
+            verification_results = previous["verification_results"]
+    reused_from = (previous.get("reused_from") or previous["id"]) if previous else None
+    if verification_results is None:
+        verification_results = run_verification_tasks(lead["instagram_username"], lead["domain"], lead["cnpj"])
+    score = calculate_score(lead["checklist"], verification_results)
+    qualification = determine_qualification(score, lead["valor_inicial"], lead["valor_atual"])
+    analysis_id = None
+    try:
+        analysis_id = lead_history.save_analysis(lead["instagram_username"], lead["domain"], lead["cnpj"], lead["checklist"],
+                                                 verification_results, score, qualification,
+                                                 valor_inicial=lead["valor_inicial"], valor_atual=lead["valor_atual"],
+                                                 verified_at=previous["verified_at"] if previous else None, reused_from=reused_from)
+    except Exception as e_history:
+        logger.error(f"Erro ao gravar análise da API no histórico: {e_history}", exc_info=True)
+    return {
+        "analysis_id": analysis_id,
+        "reused_analysis_id": reused_from,
+        "score": score,
+        "qualification": qualification,
+        "verification_results": verification_results,
+    }
+
+
+class JobManager:
+    """Fila de jobs com concorrência limitada, backpressure e chaves de idempotência."""
+
+    def __init__(self, max_workers=API_MAX_WORKERS, max_pending=API_MAX_PENDING, job_ttl_seconds=API_JOB_TTL_SECONDS,
+                 processor=process_lead):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl_seconds = job_ttl_seconds
+        self.processor = processor
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lead-worker")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._idempotency = {}
+        self._pending = 0
+        self._avg_lead_seconds = DEFAULT_LEAD_SECONDS
+
+    def retry_after_seconds(self):
+        """Estimativa de quando haverá espaço na fila, a partir da duração média dos leads."""
+        waves = max(self._pending - self.max_pending + 1, 1) / self.max_workers
+        return max(int(waves * self._avg_lead_seconds), 1)
+
+    def submit(self, leads, idempotency_key=None):
+        """Enfileira os leads como um job. Retorna (job, criado_agora)."""
+        if len(leads) > self.max_pending:
+            raise BatchTooLargeError(len(leads), self.max_pending)
+        fingerprint = hashlib.sha256(json.dumps(leads, sort_keys=True).encode("utf-8")).hexdigest()
+        with self._lock:
+            self._evict_expired()
+            if idempotency_key and idempotency_key in self._idempotency:
+                job = self._jobs.get(self._idempotency[idempotency_key])
+                if job:
+                    if job["fingerprint"] != fingerprint:
+                        raise IdempotencyConflictError("Idempotency-Key já usada com outro conteúdo.")
+                    return job, False
+            if self._pending + len(leads) > self.max_pending:
+                raise QueueFullError(self.retry_after_seconds())
+            job = {
+                "id": uuid.uuid4().hex,
+                "status": "queued",
+                "created_at": time.time(),
+                "finished_at": None,
+                "total": len(leads),
+                "completed": 0,
+                "failed": 0,
+                "results": [None] * len(leads),
+                "fingerprint": fingerprint,
+                "idempotency_key": idempotency_key,
+            }
+            self._jobs[job["id"]] = job
+            if idempotency_key:
+                self._idempotency[idempotency_key] = job["id"]
+            self._pending += len(leads)
+        for index, lead in enumerate(leads):
+            self._executor.submit(self._run_lead, job, index, lead)
+        logger.info(f"Job {job['id']} enfileirado com {len(leads)} lead(s). Pendentes: {self._pending}.")
+        return job, True
+
+    def _run_lead(self, job, index, lead):
+        started_at = time.monotonic()
+        with self._lock:
+            if job["status"] == "queued":
+                job["status"] = "running"
+        try:
+            result = {"status": "done", **self.processor(lead)}
+        except Exception as e:
+            logger.error(f"Erro ao processar lead {index} do job {job['id']}: {e}", exc_info=True)
+            result = {"status": "error", "error": str(e)}
+        elapsed = time.monotonic() - started_at
+        with self._lock:
+            job["results"][index] = {"lead": {k: lead[k] for k in ("instagram_username", "domain", "cnpj")}, **result}
+            job["completed"] += 1
+            if result["status"] == "error":
+                job["failed"] += 1
+            if job["completed"] == job["total"]:
+                job["status"] = "failed" if job["failed"] == job["total"] else "done"
+                job["finished_at"] = time.time()
+            self._pending -= 1
+            self._avg_lead_seconds = 0.8 * self._avg_lead_seconds + 0.2 * elapsed
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.job_ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job["idempotency_key"]:
+                self._idempotency.pop(job["idempotency_key"], None)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def describe(self, job, include_results=False):
+        with self._lock:
+            description = {key: job[key] for key in ("id", "status", "created_at", "finished_at", "total", "completed", "failed")}
+            if include_results:
+                description["results"] = list(job["results"])
+        return description
+
+    def health(self):
+        with self._lock:
+            return {"status": "ok", "workers": self.max_workers, "pending": self._pending, "max_pending": self.max_pending,
+                    "jobs": len(self._jobs), "avg_lead_seconds": round(self._avg_lead_seconds, 1)}
+
+
+class LeadAPIHandler(BaseHTTPRequestHandler):
+    manager = None
+    server_version = "LeadVerifierAPI/1.0"
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        if not API_TOKEN:
+            return True
+        if self.headers.get("Authorization") == f"Bearer {API_TOKEN}":
+            return True
+        self._send_json(401, {"error": "Token de acesso inválido ou ausente."})
+        return False
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            raise ValueError("Corpo da requisição vazio.")
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ValueError("Corpo da requisição não é um JSON válido.")
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._send_json(200, self.manager.health())
+        if not self._authorized():
+            return
+        match = re.fullmatch(r"/v1/jobs/([0-9a-f]{32})(/results)?", self.path)
+        if not match:
+            return self._send_json(404, {"error": "Rota não encontrada."})
+        job = self.manager.get(match.group(1))
+        if not job:
+            return self._send_json(404, {"error": "Job não encontrado ou expirado."})
+        self._send_json(200, self.manager.describe(job, include_results=bool(match.group(2))))
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path not in ("/v1/leads", "/v1/leads/batch"):
+            return self._send_json(404, {"error": "Rota não encontrada."})
+        try:
+            payload = self._read_json()
+            if self.path == "/v1/leads":
+                leads = [validate_lead(payload)]
+            else:
+                raw_leads = payload.get("leads") if isinstance(payload, dict) else None
+                if not isinstance(raw_leads, list) or not raw_leads:
+                    raise ValueError("O lote deve ter o formato {\"leads\": [...]} com pelo menos um lead.")
+                max_batch_size = min(API_MAX_BATCH_SIZE, self.manager.max_pending)
+                if len(raw_leads) > max_batch_size:
+                    raise BatchTooLargeError(len(raw_leads), max_batch_size)
+                leads = [validate_lead(lead) for lead in raw_leads]
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+        except BatchTooLargeError as e:
+            # 413 e não 429: repetir o mesmo lote nunca daria certo, mesmo com a fila vazia
+            return self._send_json(413, {"error": str(e), "max_batch_size": e.max_size})
+
+        try:
+            job, created = self.manager.submit(leads, idempotency_key=self.headers.get("Idempotency-Key"))
+        except QueueFullError as e:
+            return self._send_json(429, {"error": str(e), "retry_after": e.retry_after}, headers={"Retry-After": str(e.retry_after)})
+        except IdempotencyConflictError as e:
+            return self._send_json(422, {"error": str(e)})
+        except BatchTooLargeError as e:
+            return self._send_json(413, {"error": str(e), "max_batch_size": e.max_size})
+        description = self.manager.describe(job)
+        description["status_url"] = f"/v1/jobs/{job['id']}"
+        description["results_url"] = f"/v1/jobs/{job['id']}/results"
+        self._send_json(202 if created else 200, description, headers={"Location": description["status_url"]})
+
+
+def create_server(host=API_HOST, port=API_PORT, manager=None):
+    handler = type("BoundLeadAPIHandler", (LeadAPIHandler,), {"manager": manager or JobManager()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="API HTTP de verificação e pontuação de leads.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_MAX_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=API_MAX_PENDING)
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, JobManager(max_workers=args.workers, max_pending=args.max_pending))
+    logger.info(f"API de leads ouvindo em http://{args.host}:{args.port} ({args.workers} workers, até {args.max_pending} leads pendentes).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Encerrando API de leads.")
+    finally:
+        server.server_close()
@@ -2,143 +2,117 @@
 import streamlit as st
 import logging
 import os
-from dotenv import load_dotenv
+import time
+from datetime import datetime
 
-# Importar funções de verificação adaptadas
-from verifications_streamlit import run_verification_tasks
+# Importar funções de verificação adaptadas (o módulo carrega o .env e adia os imports pesados até o primeiro uso)
+import verifications_streamlit
+from verifications_streamlit import run_verification_tasks, OPENAI_API_KEY
+from scoring import calculate_score, determine_qualification
+import lead_history
+import ad_classifier
+import watchlist
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Carregar variáveis de ambiente (para OPENAI_API_KEY)
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# --- Lógica de Pontuação e Qualificação ---
-CRITERIA_POINTS = {
-    # 1. Faixa de Faturamento
-    "faturamento_ate_100k": -100,
-    "faturamento_100_200k": -100,
-    "faturamento_200_400k": 0,
-    "faturamento_401k_1M": 30,
-    "faturamento_1M_4M": 30,
-    # 2. Produto de Interesse
-    "interesse_assessoria": 30,
-    "interesse_estruturacao": 10,
-    "interesse_alavancagem": 0,
-    # 3. Perfil do Contato
-    "perfil_nome_completo": 30,
-    "perfil_linkedin": 30,
-    "perfil_cargo_estrategico": 30,
-    "perfil_cargo_tatico": 20,
-    "perfil_cargo_operacional": 0,
-    # 4. Qualidade do Contato
-    "contato_email_corp": 10,
-    "contato_email_pessoal": 0,
-    # 5. Estrutura Digital
-    "digital_site_funcional": 30,
-    "digital_site_fora_ar": -20,
-    "digital_produto_sinergia": 20,
-    # 6. Redes Sociais
-    "social_insta_site": 5,
-    "social_insta_google": 10,
-    "social_insta_5k": 20,
-    "social_sem_presenca": -20,
-    # 7. Validação da Empresa
-    "validacao_cnpj_localizado": 10,
-    "validacao_pessoa_qsa": 30,
-    "validacao_nome_generico": -30,
-    # 8. Urgência
-    "urgencia_imediata": 20,
-    "urgencia_3_meses": 10,
-    "urgencia_nao_informada": 0,
-    # 9. Investimento Atual
-    "investimento_google_meta": 30,
-    "investimento_google": 20,
-    "investimento_meta": 20,
-    # 10. Confirmações Manuais
-    "manual_verificado_maps": 20,
-    "manual_redirecionado_assessoria": 15
+# Aquece Selenium/chromedriver/OpenAI em segundo plano para que o primeiro lead não pague esse custo
+BACKEND_WARM_UP = os.getenv("BACKEND_WARM_UP", "true").lower() in ("1", "true", "sim", "yes")
+
+@st.cache_resource(show_spinner=False)
+def start_backend_warm_up():
+    # cache_resource: executa uma vez por processo do servidor, não a cada rerun do script
+    return verifications_streamlit.start_warm_up()
+
+QUALIFICATION_LABELS = {
+    "comprar": "🟢 Comprar",
+    "acompanhar_alto": "🟡 Acompanhar (alto)",
+    "acompanhar_baixo": "⚠️ Acompanhar (baixo)",
+    "descartar": "🔴 Descartar",
 }
 
-def calculate_score(checklist_data, verification_results):
-    total = 0
-    logger.info(f"Calculando pontuação com checklist: {checklist_data}")
-    logger.info(f"Resultados da verificação para pontuação: {verification_results}")
-
-    for key, value in checklist_data.items():
-        if key in CRITERIA_POINTS and value:
-            total += CRITERIA_POINTS.get(key, 0)
-            logger.info(f"Checklist item: \"{key}\" (Valor: {value}) adicionou {CRITERIA_POINTS.get(key, 0)}. Total parcial: {total}")
-
-    logger.info(f"Pontuação após checklist manual: {total}")
-
-    if verification_results.get("qsa_status") == "found":
-        total += CRITERIA_POINTS["validacao_cnpj_localizado"]
-        logger.info(f"QSA encontrado, adicionado {CRITERIA_POINTS['validacao_cnpj_localizado']} por CNPJ localizado. Total parcial: {total}")
-        qsa_data = verification_results.get("qsa_data", {})
-        if qsa_data and qsa_data.get("qsa") and len(qsa_data.get("qsa", [])) > 0:
-            total += CRITERIA_POINTS["validacao_pessoa_qsa"]
-            logger.info(f"Pessoas no QSA, adicionado {CRITERIA_POINTS['validacao_pessoa_qsa']}. Total parcial: {total}")
-
-    google_active = verification_results.get("google_ads_status") == "active"
-    fb_active = verification_results.get("facebook_ads_status") == "active"
-
-    if google_active and fb_active:
-        total += CRITERIA_POINTS["investimento_google_meta"]
-        logger.info(f"Google e Meta Ads ativos, adicionado {CRITERIA_POINTS['investimento_google_meta']}. Total parcial: {total}")
-    elif google_active:
-        total += CRITERIA_POINTS["investimento_google"]
-        logger.info(f"Google Ads ativo, adicionado {CRITERIA_POINTS['investimento_google']}. Total parcial: {total}")
-    elif fb_active:
-        total += CRITERIA_POINTS["investimento_meta"]
-        logger.info(f"Meta Ads ativo, adicionado {CRITERIA_POINTS['investimento_meta']}. Total parcial: {total}")
-
-    logger.info(f"Pontuação final após verificações automáticas: {total}")
-    return total
-
-def determine_qualification(score, valor_inicial, valor_atual):
-    qualification = {
-        "status": "descartar",
-        "message": "🔴 Descartar Lead",
-        "teto": 0,
-        "show_teto": False,
-        "alert": None
-    }
-    teto = 0
-    valor_inicial_num = float(valor_inicial) if valor_inicial else 0
-    valor_atual_num = float(valor_atual) if valor_atual else 0
-
-    if score >= 130:
-        teto = valor_inicial_num * 1.8
-        qualification["status"] = "comprar"
-        qualification["message"] = f"🟢 COMPRE JÁ liberado (Teto Sugerido: R$ {teto:.2f})"
-        qualification["show_teto"] = True
-    elif score >= 100:
-        teto = valor_inicial_num * 1.3
-        qualification["status"] = "acompanhar_alto"
-        qualification["message"] = f"🟡 Acompanhar (Teto Sugerido: R$ {teto:.2f})"
-        qualification["show_teto"] = True
-    elif score >= 80:
-        teto = valor_inicial_num
-        qualification["status"] = "acompanhar_baixo"
-        qualification["message"] = f"⚠️ Acompanhar (Teto Sugerido: R$ {teto:.2f})"
-        qualification["show_teto"] = True
-
-    qualification["teto"] = teto
-
-    if valor_atual_num > teto and score >= 80 and teto > 0:
-        qualification["alert"] = f"❗ Valor atual (R$ {valor_atual_num:.2f}) ultrapassou teto sugerido (R$ {teto:.2f}). Reavaliar risco!"
-
-    logger.info(f"Resultado da qualificação: {qualification}")
-    return qualification
+def format_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%d/%m/%Y %H:%M")
+
+def render_history_page():
+    st.title("🗂️ Histórico de Leads")
+    try:
+        resumo = lead_history.summary()
+    except Exception as e_history:
+        st.error(f"Não foi possível abrir o histórico de leads: {e_history}")
+        logger.error(f"Erro ao abrir histórico de leads: {e_history}", exc_info=True)
+        return
+
+    metric_cols = st.columns(len(QUALIFICATION_LABELS))
+    for col, (status, label) in zip(metric_cols, QUALIFICATION_LABELS.items()):
+        col.metric(label, resumo.get(status, {}).get("total", 0))
+
+    filter_cols = st.columns([0.4, 0.3, 0.15, 0.15])
+    with filter_cols[0]:
+        search = st.text_input("Buscar por CNPJ, domínio ou Instagram", key="history_search")
+    with filter_cols[1]:
+        status_label = st.selectbox("Qualificação", ["Todas"] + list(QUALIFICATION_LABELS.values()), key="history_status")
+    with filter_cols[2]:
+        page_size = st.selectbox("Por página", [25, 50, 100, 200], index=1, key="history_page_size")
+    status_filter = next((status for status, label in QUALIFICATION_LABELS.items() if label == status_label), None)
+
+    _, total = lead_history.list_analyses(page=1, page_size=1, qualification_status=status_filter, search=search or None)
+    total_pages = max((total + page_size - 1) // page_size, 1)
+    with filter_cols[3]:
+        page = st.number_input("Página", min_value=1, max_value=total_pages, value=1, step=1, key="history_page")
+
+    records, total = lead_history.list_analyses(page=page, page_size=page_size, qualification_status=status_filter, search=search or None)
+    st.caption(f"{total} análises encontradas. Página {page} de {total_pages}.")
+    if not records:
+        st.info("Nenhuma análise encontrada no histórico.")
+        return
+
+    st.dataframe([
+        {
+            "ID": record["id"],
+            "Data": format_timestamp(record["created_at"]),
+            "Instagram": record["instagram_username"] or "",
+            "Domínio": record["domain"] or "",
+            "CNPJ": record["cnpj"] or "",
+            "Razão Social": record["razao_social"] or "",
+            "Pontuação": record["score"],
+            "Qualificação": QUALIFICATION_LABELS.get(record["qualification_status"], record["qualification_status"]),
+            "Teto (R$)": round(record["teto"] or 0, 2),
+            "Meta Ads": record["facebook_ads_status"],
+            "Google Ads": record["google_ads_status"],
+        }
+        for record in records
+    ], use_container_width=True, hide_index=True)
+
+    with st.expander("🔎 Detalhes de uma análise"):
+        analysis_id = st.selectbox("ID da análise", [record["id"] for record in records], key="history_detail_id")
+        detail = lead_history.get_analysis(analysis_id)
+        if detail:
+            st.json(detail)
 
 # --- Interface Streamlit ---
 st.set_page_config(layout="wide")
+if BACKEND_WARM_UP:
+    start_backend_warm_up()
+
+with st.sidebar:
+    pagina = st.radio("Navegação", ["🔍 Analisar Lead", "🗂️ Histórico de Leads"], key="pagina")
+    st.divider()
+    reuse_recent = st.checkbox("Reutilizar verificações recentes", value=True, key="reuse_recent", help="Se o lead já foi analisado, reaproveita as verificações automáticas (anúncios e CNPJ) em vez de refazê-las.")
+    reuse_max_age_hours = st.number_input("Se mais recentes que (horas)", min_value=1, max_value=24 * 90, value=24, step=1, key="reuse_max_age_hours", disabled=not reuse_recent)
+    auto_watch = st.checkbox("Adicionar leads em 'Acompanhar' à watchlist", value=True, key="auto_watch", help="Leads qualificados como 'Acompanhar' serão reverificados automaticamente fora do horário de pico.")
+
+if pagina == "🗂️ Histórico de Leads":
+    render_history_page()
+    st.stop()
+
 st.title("Verificador de Leads V4 Company")
 
-if not OPENAI_API_KEY:
+LOCAL_CLASSIFIER_AVAILABLE = ad_classifier.model_available()
+if not OPENAI_API_KEY and LOCAL_CLASSIFIER_AVAILABLE:
+    st.warning("Chave da API OpenAI (OPENAI_API_KEY) não encontrada. A análise de anúncios usará apenas o classificador local.")
+elif not OPENAI_API_KEY:
     st.error("Chave da API OpenAI (OPENAI_API_KEY) não encontrada. Configure-a no arquivo .env ou como variável de ambiente para habilitar a análise de anúncios.")
 
 # Usar colunas para layout principal: Dados à esquerda, Checklist à direita
@@ -150,6 +124,22 @@ with main_col1:
         instagram_username = st.text_input("👤 Instagram (usuário)", key="instagram_username", placeholder="Ex: nomeusuario", help="Nome de usuário do Instagram para análise de Meta Ads.")
         domain = st.text_input("🌐 Website (domínio)", key="domain", placeholder="Ex: nomedaempresa.com.br", help="Domínio para análise de Google Ads.")
         cnpj = st.text_input("🏢 CNPJ", key="cnpj", placeholder="00.000.000/0000-00", help="CNPJ para consulta de QSA na ReceitaWS.")
+
+        previous_analysis = None
+        if instagram_username or domain or cnpj:
+            try:
+                previous_analysis = lead_history.find_latest(instagram_username, domain, cnpj)
+            except Exception as e_history:
+                logger.error(f"Erro ao consultar histórico de leads: {e_history}", exc_info=True)
+        if previous_analysis:
+            age_hours = (time.time() - previous_analysis["created_at"]) / 3600
+            st.info(
+                f"🗂️ Lead já analisado em {format_timestamp(previous_analysis['created_at'])} ({age_hours:.0f}h atrás): "
+                f"{previous_analysis['score']} pontos, "
+                f"{QUALIFICATION_LABELS.get(previous_analysis['qualification_status'], previous_analysis['qualification_status'])}, "
+                f"teto R$ {previous_analysis['teto'] or 0:.2f}. "
+                f"Meta Ads: {previous_analysis['facebook_ads_status']} | Google Ads: {previous_analysis['google_ads_status']} | CNPJ: {previous_analysis['qsa_status']}"
+            )
         
         st.subheader("💰 Valores do Leilão")
         val_col1, val_col2 = st.columns(2)
@@ -253,7 +243,7 @@ with btn_cols[1]:
     if st.button(" Analisar Lead Agora! ", key="calculateButton", use_container_width=True, type="primary"):
         if not instagram_username and not domain and not cnpj:
             st.warning("Por favor, forneça pelo menos um Instagram, Domínio ou CNPJ para análise.")
-        elif not OPENAI_API_KEY and (instagram_username or domain):
+        elif not OPENAI_API_KEY and not LOCAL_CLASSIFIER_AVAILABLE and (instagram_username or domain):
             st.error("A análise de anúncios (Instagram/Google) requer a chave OPENAI_API_KEY. Verifique a configuração.")
         else:
             # Construir o checklist_data final para a função calculate_score
@@ -270,9 +260,39 @@ with btn_cols[1]:
 
             with st.spinner("Analisando o lead... Isso pode levar alguns minutos, especialmente as verificações de anúncios. ⏳"):
                 try:
-                    verification_results = run_verification_tasks(instagram_username, domain, cnpj)
+                    reused_analysis = None
+                    if reuse_recent:
+                        # Só reaproveita se todos os identificadores batem: um domínio em comum não basta
+                        try:
+                            reused_analysis = lead_history.find_reusable(instagram_username, domain, cnpj, max_age_hours=reuse_max_age_hours)
+                        except Exception as e_history:
+                            logger.error(f"Erro ao consultar histórico de leads: {e_history}", exc_info=True)
+                    if reused_analysis:
+                        verification_results = reused_analysis["verification_results"]
+                        st.info(f"♻️ Verificações automáticas reaproveitadas da análise de {format_timestamp(reused_analysis['verified_at'])}.")
+                        logger.info(f"Reutilizando verificações da análise {reused_analysis['id']} do histórico.")
+                    else:
+                        verification_results = run_verification_tasks(instagram_username, domain, cnpj)
                     score = calculate_score(final_checklist, verification_results)
                     qualification = determine_qualification(score, valor_inicial, valor_atual)
+                    try:
+                        # Reaproveitamentos mantêm a data das verificações originais, senão elas nunca venceriam
+                        lead_history.save_analysis(instagram_username, domain, cnpj, final_checklist, verification_results,
+                                                   score, qualification, valor_inicial=valor_inicial, valor_atual=valor_atual,
+                                                   verified_at=reused_analysis["verified_at"] if reused_analysis else None,
+                                                   reused_from=(reused_analysis.get("reused_from") or reused_analysis["id"]) if reused_analysis else None)
+                    except Exception as e_history:
+                        logger.error(f"Erro ao gravar análise no histórico: {e_history}", exc_info=True)
+                    if auto_watch and qualification["status"] in watchlist.TRACKED_STATUSES:
+                        try:
+                            watchlist.add_lead(instagram_username, domain, cnpj, checklist=final_checklist,
+                                               valor_inicial=valor_inicial, valor_atual=valor_atual,
+                                               verification_results=verification_results, score=score,
+                                               qualification_status=qualification["status"],
+                                               checked_at=reused_analysis["verified_at"] if reused_analysis else None)
+                            st.caption("👀 Lead adicionado à watchlist para reverificação automática.")
+                        except Exception as e_watch:
+                            logger.error(f"Erro ao adicionar lead à watchlist: {e_watch}", exc_info=True)
 
                     # Exibição dos Resultados em Abas
                     st.header("📈 Resultados da Análise do Lead")
@@ -0,0 +1,279 @@
+"""
+Execução em lote de verificações de leads em múltiplos processos (um Chrome por worker).
+
+Cada processo worker mantém seu próprio Chrome e seu próprio cliente OpenAI durante todo o lote,
+contornando o GIL e o custo de abrir um navegador por lead. O processo principal entrega um lead
+por vez a cada worker livre, recebe os resultados em JSON comprimido (zlib) e os devolve à medida
+que ficam prontos. Workers que morrem ou travam são substituídos e seu lead é tentado de novo.
+
+Uso:
+    python bulk_executor.py leads.csv --workers 4 --output resultados.jsonl
+O arquivo de entrada pode ser CSV (colunas instagram_username, domain, cnpj, valor_inicial, valor_atual)
+ou JSONL (um lead por linha, no mesmo formato da API, incluindo "checklist").
+"""
+import os
+import json
+import time
+import zlib
+import queue
+import signal
+import logging
+import multiprocessing
+from collections import deque
+
+from process_metrics import process_tree_pids, process_tree_rss_mb
+
+logger = logging.getLogger(__name__)
+
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", str(os.cpu_count() or 2)))
+# Limite de memória (RSS) por worker, somando o processo Python, o chromedriver e o Chrome (0 desativa)
+BULK_WORKER_MAX_RSS_MB = int(os.getenv("BULK_WORKER_MAX_RSS_MB", "1500"))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "2"))
+# Tempo máximo de um lead antes de o worker ser considerado travado e substituído
+BULK_LEAD_TIMEOUT_SECONDS = float(os.getenv("BULK_LEAD_TIMEOUT_SECONDS", "600"))
+
+
+def encode_payload(payload):
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+def decode_payload(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def _driver_alive(driver):
+    try:
+        driver.window_handles
+        return True
+    except Exception:
+        return False
+
+
+def _process_lead(lead, driver):
+    from verifications_streamlit import run_verification_tasks
+    from scoring import calculate_score, determine_qualification
+
+    verification_results = run_verification_tasks(lead.get("instagram_username"), lead.get("domain"), lead.get("cnpj"), driver=driver)
+    payload = {"status": "done", "verification_results": verification_results}
+    if "checklist" in lead or "valor_inicial" in lead:
+        score = calculate_score(lead.get("checklist") or {}, verification_results)
+        payload["score"] = score
+        payload["qualification"] = determine_qualification(score, lead.get("valor_inicial"), lead.get("valor_atual"))
+    return payload
+
+
+def _worker_main(worker_id, task_queue, result_queue, max_rss_mb):
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - worker {worker_id} - %(levelname)s - %(message)s')
+    import verifications_streamlit
+
+    verifications_streamlit.get_openai_client()
+    driver = None
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            task_id, lead = task
+            try:
+                if driver is None and (lead.get("instagram_username") or lead.get("domain")):
+                    driver = verifications_streamlit.setup_selenium_driver(extra_arguments=verifications_streamlit.BACKGROUND_TAB_ARGUMENTS)
+                payload = _process_lead(lead, driver)
+            except Exception as e:
+                logger.error(f"Erro ao processar lead {task_id}: {e}", exc_info=True)
+                payload = {"status": "error", "error": str(e)}
+
+            # O aviso de reciclagem vai junto do resultado, para o processo principal não entregar outro lead a este worker
+            recycle = False
+            if driver is not None and not _driver_alive(driver):
+                logger.warning("Chrome do worker não responde mais. Ele será recriado no próximo lead.")
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+                driver = None
+            rss_mb = process_tree_rss_mb() if max_rss_mb else None
+            if rss_mb and rss_mb > max_rss_mb:
+                logger.warning(f"Worker usando {rss_mb:.0f} MB (limite {max_rss_mb} MB). Reiniciando o Chrome.")
+                if driver is not None:
+                    driver.quit()
+                    driver = None
+                rss_mb = process_tree_rss_mb()
+                if rss_mb and rss_mb > max_rss_mb:
+                    logger.warning(f"Worker ainda usa {rss_mb:.0f} MB sem o Chrome. Encerrando para ser substituído.")
+                    recycle = True
+            result_queue.put(("done", worker_id, task_id, encode_payload(payload), recycle))
+            if recycle:
+                break
+    finally:
+        if driver is not None:
+            driver.quit()
+
+
+class _Worker:
+    def __init__(self, context, worker_id, result_queue, max_rss_mb):
+        self.worker_id = worker_id
+        self.task_queue = context.Queue()
+        self.process = context.Process(target=_worker_main, args=(worker_id, self.task_queue, result_queue, max_rss_mb),
+                                       name=f"lead-worker-{worker_id}", daemon=True)
+        self.process.start()
+        self.task_id = None
+        self.started_at = None
+        self.retiring = False
+
+    def assign(self, task_id, lead):
+        self.task_id = task_id
+        self.started_at = time.monotonic()
+        self.task_queue.put((task_id, lead))
+
+    def stop(self):
+        if self.process.is_alive():
+            self.task_queue.put(None)
+
+    def kill(self):
+        """Encerra o worker e seus descendentes (chromedriver e Chrome), que o driver.quit() do worker não chegará a fechar."""
+        # Coleta a árvore antes de encerrar o worker: depois os filhos seriam reparentados e ficariam órfãos
+        descendants = process_tree_pids(self.process.pid)[1:] if os.path.exists(f"/proc/{self.process.pid}") else []
+        self.process.terminate()
+        for pid in descendants:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        self.process.join(5)
+        for pid in descendants:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+
+def run_bulk(leads, workers=None, max_rss_mb=None, max_retries=None, lead_timeout=None):
+    """
+    Processa os leads em `workers` processos e devolve (índice, resultado) na ordem em que terminam.
+
+    Cada resultado é um dict com "status" ("done" ou "error") e, em caso de sucesso, "verification_results"
+    e, se o lead trouxer checklist/valores, "score" e "qualification".
+    """
+    leads = list(leads)
+    workers = max(1, min(workers or BULK_WORKERS, len(leads) or 1))
+    max_rss_mb = BULK_WORKER_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+    max_retries = BULK_MAX_RETRIES if max_retries is None else max_retries
+    lead_timeout = lead_timeout or BULK_LEAD_TIMEOUT_SECONDS
+
+    # spawn: cada worker começa limpo, sem herdar threads/locks do processo principal (fork + Chrome é frágil)
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    pending = deque(range(len(leads)))
+    attempts = [0] * len(leads)
+    completed = set()
+    next_worker_id = workers
+    pool = {worker_id: _Worker(context, worker_id, result_queue, max_rss_mb) for worker_id in range(workers)}
+    logger.info(f"Lote de {len(leads)} leads iniciado com {workers} workers.")
+
+    def dispatch():
+        for worker in pool.values():
+            if worker.task_id is None and not worker.retiring and pending:
+                task_id = pending.popleft()
+                attempts[task_id] += 1
+                worker.assign(task_id, leads[task_id])
+
+    try:
+        dispatch()
+        while len(completed) < len(leads):
+            try:
+                kind, worker_id, task_id, data, recycle = result_queue.get(timeout=1)
+            except queue.Empty:
+                kind = None
+            if kind == "done":
+                worker = pool.get(worker_id)
+                if worker and worker.task_id == task_id:
+                    worker.task_id = None
+                if worker and recycle:
+                    worker.retiring = True
+                if task_id not in completed:
+                    completed.add(task_id)
+                    yield task_id, decode_payload(data)
+
+            now = time.monotonic()
+            for worker_id, worker in list(pool.items()):
+                hung = worker.task_id is not None and now - worker.started_at > lead_timeout
+                if worker.process.is_alive() and not hung:
+                    continue
+                if hung:
+                    logger.error(f"Worker {worker_id} travado no lead {worker.task_id} há mais de {lead_timeout:.0f}s. Encerrando.")
+                    worker.kill()
+                elif not worker.retiring:
+                    logger.error(f"Worker {worker_id} morreu (exit code {worker.process.exitcode}).")
+                del pool[worker_id]
+                task_id = worker.task_id
+                if task_id is not None and task_id not in completed:
+                    if attempts[task_id] <= max_retries:
+                        logger.info(f"Lead {task_id} será tentado novamente (tentativa {attempts[task_id] + 1}).")
+                        pending.appendleft(task_id)
+                    else:
+                        completed.add(task_id)
+                        yield task_id, {"status": "error", "error": f"Worker falhou {attempts[task_id]} vezes processando este lead."}
+                if len(completed) < len(leads):
+                    pool[next_worker_id] = _Worker(context, next_worker_id, result_queue, max_rss_mb)
+                    next_worker_id += 1
+            dispatch()
+    finally:
+        for worker in pool.values():
+            worker.stop()
+        for worker in pool.values():
+            worker.process.join(30)
+            if worker.process.is_alive():
+                worker.kill()
+    logger.info(f"Lote concluído: {len(completed)} leads.")
+
+
+def load_leads(path):
+    """Lê leads de um CSV (cabeçalho com instagram_username, domain, cnpj, valor_inicial, valor_atual) ou JSONL."""
+    import csv
+
+    leads = []
+    with open(path, encoding="utf-8") as leads_file:
+        if path.endswith(".jsonl"):
+            leads = [json.loads(line) for line in leads_file if line.strip()]
+        else:
+            for row in csv.DictReader(leads_file):
+                lead = {key: (row.get(key) or "").strip() for key in ("instagram_username", "domain", "cnpj")}
+                for key in ("valor_inicial", "valor_atual"):
+                    if row.get(key):
+                        lead[key] = float(row[key])
+                leads.append(lead)
+    return leads
+
+
+if __name__ == '__main__':
+    import sys
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Verificação de leads em lote, em múltiplos processos.")
+    parser.add_argument("input", help="Arquivo .csv ou .jsonl com os leads.")
+    parser.add_argument("--output", help="Arquivo JSONL de saída (padrão: stdout).")
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+    parser.add_argument("--max-rss-mb", type=int, default=BULK_WORKER_MAX_RSS_MB)
+    parser.add_argument("--max-retries", type=int, default=BULK_MAX_RETRIES)
+    parser.add_argument("--save-history", action="store_true", help="Grava os leads pontuados no histórico de leads.")
+    args = parser.parse_args()
+
+    input_leads = load_leads(args.input)
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    started_at = time.monotonic()
+    try:
+        for index, result in run_bulk(input_leads, workers=args.workers, max_rss_mb=args.max_rss_mb, max_retries=args.max_retries):
+            lead = input_leads[index]
+            if args.save_history and result["status"] == "done" and "score" in result:
+                import lead_history
+                lead_history.save_analysis(lead.get("instagram_username"), lead.get("domain"), lead.get("cnpj"),
+                                           lead.get("checklist") or {}, result["verification_results"], result["score"],
+                                           result["qualification"], valor_inicial=lead.get("valor_inicial"),
+                                           valor_atual=lead.get("valor_atual"))
+            output.write(json.dumps({"index": index, "lead": lead, **result}, ensure_ascii=False, default=str) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    logger.info(f"{len(input_leads)} leads processados em {time.monotonic() - started_at:.1f}s.")
@@ -0,0 +1,263 @@
+"""
+Histórico local de análises de leads (SQLite).
+
+Cada análise é gravada com as verificações, pontuação, qualificação e teto, indexada por CNPJ,
+domínio e usuário do Instagram. Permite reaproveitar resultados recentes quando um lead volta
+em outro leilão e consultar milhares de análises com leitura paginada.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+LEAD_HISTORY_DB_PATH = os.getenv("LEAD_HISTORY_DB_PATH", "lead_history.db")
+
+_write_lock = threading.Lock()
+_initialized_paths = set()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lead_analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    instagram_username TEXT,
+    domain TEXT,
+    cnpj TEXT,
+    score INTEGER NOT NULL,
+    qualification_status TEXT NOT NULL,
+    teto REAL,
+    valor_inicial REAL,
+    valor_atual REAL,
+    facebook_ads_status TEXT,
+    google_ads_status TEXT,
+    qsa_status TEXT,
+    razao_social TEXT,
+    checklist TEXT,
+    verification_results TEXT,
+    qualification TEXT,
+    reused_from INTEGER,
+    verified_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_lead_analyses_cnpj ON lead_analyses(cnpj, created_at);
+CREATE INDEX IF NOT EXISTS idx_lead_analyses_domain ON lead_analyses(domain, created_at);
+CREATE INDEX IF NOT EXISTS idx_lead_analyses_instagram ON lead_analyses(instagram_username, created_at);
+CREATE INDEX IF NOT EXISTS idx_lead_analyses_created_at ON lead_analyses(created_at);
+CREATE INDEX IF NOT EXISTS idx_lead_analyses_status ON lead_analyses(qualification_status, created_at);
+"""
+# Colunas adicionadas depois da criação da tabela: bancos antigos recebem um ALTER TABLE
+_ADDED_COLUMNS = (("reused_from", "INTEGER"), ("verified_at", "REAL"))
+
+_JSON_COLUMNS = ("checklist", "verification_results", "qualification")
+
+
+def normalize_cnpj(cnpj):
+    digits = ''.join(filter(str.isdigit, cnpj or ""))
+    return digits or None
+
+
+def normalize_domain(domain):
+    domain = (domain or "").strip().lower()
+    domain = re.sub(r"^https?://", "", domain)
+    domain = re.sub(r"^www\.", "", domain)
+    return domain.split("/")[0] or None
+
+
+def normalize_instagram(instagram_username):
+    username = (instagram_username or "").strip().lower()
+    username = re.sub(r"^(https?://)?(www\.)?instagram\.com/", "", username)
+    return username.strip("@/") or None
+
+
+def _connect(db_path=None):
+    path = db_path or LEAD_HISTORY_DB_PATH
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if path not in _initialized_paths:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(lead_analyses)")}
+        with conn:
+            for column, column_type in _ADDED_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE lead_analyses ADD COLUMN {column} {column_type}")
+        _initialized_paths.add(path)
+    return conn
+
+
+def _row_to_dict(row, include_details=True):
+    record = dict(row)
+    for column in _JSON_COLUMNS:
+        if column not in record:
+            continue
+        if include_details and record[column]:
+            record[column] = json.loads(record[column])
+        elif not include_details:
+            record.pop(column)
+    return record
+
+
+def save_analysis(instagram_username, domain, cnpj, checklist, verification_results, score, qualification,
+                  valor_inicial=None, valor_atual=None, created_at=None, reused_from=None, verified_at=None, db_path=None):
+    """
+    Grava uma análise completa no histórico e retorna o id do registro.
+
+    `created_at` é a data da análise; `verified_at` é a data das verificações automáticas (padrão: a mesma).
+    Se as verificações foram reaproveitadas de outra análise, passe `reused_from` com o id dela e `verified_at`
+    com a data das verificações dela, para que a idade delas não seja renovada a cada reaproveitamento.
+    """
+    qsa_data = verification_results.get("qsa_data") or {}
+    created_at = created_at or time.time()
+    row = (
+        created_at,
+        normalize_instagram(instagram_username),
+        normalize_domain(domain),
+        normalize_cnpj(cnpj),
+        int(score),
+        qualification.get("status", "descartar"),
+        qualification.get("teto"),
+        valor_inicial,
+        valor_atual,
+        verification_results.get("facebook_ads_status"),
+        verification_results.get("google_ads_status"),
+        verification_results.get("qsa_status"),
+        qsa_data.get("razao_social"),
+        json.dumps(checklist, ensure_ascii=False),
+        json.dumps(verification_results, ensure_ascii=False, default=str),
+        json.dumps(qualification, ensure_ascii=False),
+        reused_from,
+        verified_at or created_at,
+    )
+    with _write_lock:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO lead_analyses (created_at, instagram_username, domain, cnpj, score, qualification_status, teto, "
+                    "valor_inicial, valor_atual, facebook_ads_status, google_ads_status, qsa_status, razao_social, "
+                    "checklist, verification_results, qualification, reused_from, verified_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+                analysis_id = cursor.lastrowid
+        finally:
+            conn.close()
+    logger.info(f"Análise {analysis_id} gravada no histórico (score {score}, {qualification.get('status')}).")
+    return analysis_id
+
+
+def find_latest(instagram_username=None, domain=None, cnpj=None, max_age_hours=None, db_path=None):
+    """
+    Retorna a análise mais recente que compartilhe algum identificador (CNPJ, domínio ou Instagram), ou None.
+
+    Cada identificador usa seu próprio índice; com `max_age_hours` apenas análises mais novas que isso são consideradas.
+    Serve para avisar que o lead já foi visto; para reaproveitar verificações use `find_reusable`.
+    """
+    identifiers = [
+        ("cnpj", normalize_cnpj(cnpj)),
+        ("domain", normalize_domain(domain)),
+        ("instagram_username", normalize_instagram(instagram_username)),
+    ]
+    identifiers = [(column, value) for column, value in identifiers if value]
+    if not identifiers:
+        return None
+    min_created_at = time.time() - max_age_hours * 3600 if max_age_hours else 0
+
+    conn = _connect(db_path)
+    try:
+        # UNION de consultas por coluna para que cada uma use seu índice (um OR entre colunas faria varredura completa)
+        sql = " UNION ALL ".join(
+            f"SELECT * FROM (SELECT * FROM lead_analyses WHERE {column} = ? AND created_at >= ? ORDER BY created_at DESC LIMIT 1)"
+            for column, _ in identifiers
+        )
+        params = []
+        for _, value in identifiers:
+            params.extend([value, min_created_at])
+        rows = conn.execute(f"SELECT * FROM ({sql}) ORDER BY created_at DESC LIMIT 1", params).fetchall()
+    finally:
+        conn.close()
+    return _row_to_dict(rows[0]) if rows else None
+
+
+def find_reusable(instagram_username=None, domain=None, cnpj=None, max_age_hours=None, db_path=None):
+    """
+    Retorna a análise mais recente com exatamente os mesmos identificadores (CNPJ, domínio e Instagram), ou None.
+
+    Identificadores não informados precisam estar vazios também na análise gravada: as verificações dela
+    (anúncios e QSA) só valem para a mesma combinação de identificadores. `max_age_hours` se aplica à data
+    das verificações (`verified_at`), não à da análise.
+    """
+    identifiers = (normalize_cnpj(cnpj), normalize_domain(domain), normalize_instagram(instagram_username))
+    if not any(identifiers):
+        return None
+    min_verified_at = time.time() - max_age_hours * 3600 if max_age_hours else 0
+
+    conn = _connect(db_path)
+    try:
+        # Análises gravadas antes da coluna verified_at existir usam a própria data
+        row = conn.execute(
+            "SELECT * FROM lead_analyses WHERE cnpj IS ? AND domain IS ? AND instagram_username IS ? "
+            "AND COALESCE(verified_at, created_at) >= ? ORDER BY COALESCE(verified_at, created_at) DESC LIMIT 1",
+            identifiers + (min_verified_at,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    analysis = _row_to_dict(row)
+    analysis["verified_at"] = analysis["verified_at"] or analysis["created_at"]
+    return analysis
+
+
+def get_analysis(analysis_id, db_path=None):
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT * FROM lead_analyses WHERE id = ?", (analysis_id,)).fetchone()
+    finally:
+        conn.close()
+    return _row_to_dict(row) if row else None
+
+
+def list_analyses(page=1, page_size=50, qualification_status=None, search=None, db_path=None):
+    """
+    Lista análises das mais recentes para as mais antigas, paginadas, sem os campos JSON detalhados.
+
+    `search` filtra por identificador exato (CNPJ, domínio ou Instagram). Retorna (registros, total).
+    """
+    conditions = []
+    params = []
+    if qualification_status:
+        conditions.append("qualification_status = ?")
+        params.append(qualification_status)
+    if search:
+        conditions.append("(cnpj = ? OR domain = ? OR instagram_username = ?)")
+        params.extend([normalize_cnpj(search) or "", normalize_domain(search) or "", normalize_instagram(search) or ""])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    columns = ("id, created_at, instagram_username, domain, cnpj, score, qualification_status, teto, valor_inicial, "
+               "valor_atual, facebook_ads_status, google_ads_status, qsa_status, razao_social")
+    page = max(int(page), 1)
+
+    conn = _connect(db_path)
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM lead_analyses {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {columns} FROM lead_analyses {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            params + [int(page_size), (page - 1) * int(page_size)]
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_row_to_dict(row, include_details=False) for row in rows], total
+
+
+def summary(db_path=None):
+    """Contagem de análises por status de qualificação, para o painel de histórico."""
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT qualification_status, COUNT(*) AS total, AVG(score) AS avg_score FROM lead_analyses GROUP BY qualification_status"
+        ).fetchall()
+    finally:
+        conn.close()
+    return {row["qualification_status"]: {"total": row["total"], "avg_score": row["avg_score"]} for row in rows}
@@ -0,0 +1,432 @@
+"""
+Teste de carga do app.py: N sessões Streamlit simuladas e concorrentes executando o fluxo completo
+do botão "Analisar Lead Agora!" contra serviços locais que substituem Facebook Ads Library, Google Ads
+Transparency, ReceitaWS e OpenAI.
+
+Para cada nível de concorrência é iniciado um servidor `streamlit run app.py --server.headless true`
+novo, e N analistas simulados (um Chrome headless cliente cada, via Selenium) abrem o app no navegador,
+preenchem o lead e clicam no botão ao mesmo tempo. Assim as threads de script disputam o mesmo processo,
+o cache_resource e o aquecimento são compartilhados como em produção, e os resultados são renderizados
+para um cliente real. São medidos: latência do clique até a pontuação aparecer (p50/p90/p95/p99), RSS
+da árvore de processos do servidor (Python + chromedriver + Chrome do app), número de processos do
+Chrome do servidor e taxa de erro. Os Chromes clientes ficam fora dessa árvore, mas disputam a mesma
+CPU. O relatório JSON pode ser comparado com o de uma versão anterior (`--baseline`).
+
+O chromedriver precisa estar instalado localmente (CHROMEDRIVER_PATH, `--chromedriver` ou no PATH):
+ele é usado pelo app e pelos clientes, e nada é baixado durante o teste.
+
+Uso:
+    python load_test.py --levels 1,2,4,8 --output capacidade.json
+    python load_test.py --levels 1,2,4,8 --baseline capacidade_v1.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import shutil
+import socket
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from process_metrics import process_tree_pids, process_tree_rss_mb, count_descendants_named
+
+logger = logging.getLogger(__name__)
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Trechos das mensagens st.error do app que indicam falha; 'Descartar' e alertas de qualificação também usam st.error
+_ERROR_MARKERS = ("🔴 Erro", "Ocorreu um erro", "requer a chave OPENAI_API_KEY")
+
+_FILLER = " ".join(["Biblioteca de anúncios", "Filtros", "Todos os anúncios", "Plataformas", "Categorias", "Região Brasil"] * 20)
+
+
+def _is_active(query):
+    # Determinístico por consulta, para que a mesma sessão produza sempre o mesmo resultado
+    return int(hashlib.sha256(query.encode("utf-8")).hexdigest(), 16) % 2 == 0
+
+
+class StubServiceHandler(BaseHTTPRequestHandler):
+    """Substitutos locais dos serviços externos, com latência configurável."""
+    page_latency = 0.0
+    receitaws_latency = 0.0
+    openai_latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/facebook":
+            time.sleep(self.page_latency)
+            query = params.get("q", [""])[0]
+            results = f"Anúncios de {query} ~12 resultados Saiba mais Comprar agora Veiculação iniciada em 01/10" if _is_active(query) else "0 resultados Nenhum anúncio encontrado"
+            return self._send(200, f"<html><body><h1>Biblioteca de Anúncios</h1><p>{results}</p><p>{_FILLER}</p></body></html>", "text/html; charset=utf-8")
+        if url.path == "/google":
+            time.sleep(self.page_latency)
+            domain = params.get("domain", [""])[0]
+            results = f"Anunciante verificado {domain} 8 anúncios Todos os formatos" if _is_active(domain) else "Nenhum anúncio encontrado para este anunciante"
+            return self._send(200, f"<html><body><p>{results}</p><p>{_FILLER}</p><footer>Centro de Transparência de Anúncios</footer></body></html>", "text/html; charset=utf-8")
+        if url.path.startswith("/receitaws/"):
+            time.sleep(self.receitaws_latency)
+            cnpj = url.path.rsplit("/", 1)[-1]
+            payload = {
+                "status": "OK", "cnpj": cnpj, "nome": f"EMPRESA TESTE {cnpj} LTDA", "situacao": "ATIVA", "tipo": "MATRIZ",
+                "abertura": "01/01/2015", "natureza_juridica": "206-2 - Sociedade Empresária Limitada",
+                "atividade_principal": [{"code": "73.19-0-02", "text": "Promoção de vendas"}],
+                "qsa": [{"nome": "SOCIO TESTE", "qual": "49-Sócio-Administrador"}],
+                "logradouro": "RUA TESTE", "numero": "100", "complemento": "", "bairro": "CENTRO", "municipio": "SAO PAULO",
+                "uf": "SP", "cep": "01000-000", "telefone": "(11) 0000-0000", "email": "contato@teste.com.br", "data_situacao": "01/01/2015",
+            }
+            return self._send(200, json.dumps(payload, ensure_ascii=False), "application/json; charset=utf-8")
+        self._send(404, "{}", "application/json")
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            return self._send(404, "{}", "application/json")
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        time.sleep(self.openai_latency)
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        # Olha só o conteúdo da página: as instruções do prompt também citam 'Saiba mais' e 'Anunciante verificado'
+        page = prompt.split("--- INÍCIO DO CONTEÚDO ---")[-1].split("--- FIM DO CONTEÚDO ---")[0]
+        answer = "Sim" if ("Saiba mais" in page or "Anunciante verificado" in page) else "Não"
+        payload = {
+            "id": "chatcmpl-loadtest", "object": "chat.completion", "created": int(time.time()), "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop", "logprobs": None}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 1, "total_tokens": len(prompt) // 4 + 1},
+        }
+        self._send(200, json.dumps(payload, ensure_ascii=False), "application/json; charset=utf-8")
+
+
+def start_stub_services(page_latency=0.0, receitaws_latency=0.0, openai_latency=0.0):
+    handler = type("ConfiguredStubServiceHandler", (StubServiceHandler,), {
+        "page_latency": page_latency, "receitaws_latency": receitaws_latency, "openai_latency": openai_latency,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, name="stub-services", daemon=True).start()
+    return server
+
+
+def configure_environment(base_url, data_dir, use_local_classifier=False, chromedriver_path=None):
+    """
+    Aponta o app para os serviços locais, para bancos temporários e para um chromedriver local.
+    Deve rodar antes de iniciar o servidor, que herda este ambiente. Retorna o caminho do chromedriver.
+    """
+    chromedriver_path = chromedriver_path or os.getenv("CHROMEDRIVER_PATH") or shutil.which("chromedriver")
+    if not chromedriver_path:
+        raise ValueError("chromedriver não encontrado. Informe --chromedriver ou CHROMEDRIVER_PATH "
+                         "(sem ele o aquecimento consultaria o webdriver-manager pela rede).")
+    os.environ.update({
+        "CHROMEDRIVER_PATH": chromedriver_path,
+        "FACEBOOK_ADS_LIBRARY_URL": f"{base_url}/facebook?q={{query}}",
+        "GOOGLE_ADS_TRANSPARENCY_URL": f"{base_url}/google?domain={{query}}",
+        "RECEITAWS_URL": f"{base_url}/receitaws/{{cnpj}}",
+        "OPENAI_BASE_URL": f"{base_url}/openai/v1",
+        "OPENAI_API_KEY": "load-test",
+        "LEAD_HISTORY_DB_PATH": os.path.join(data_dir, "lead_history.db"),
+        "WATCHLIST_DB_PATH": os.path.join(data_dir, "watchlist.db"),
+        "SNAPSHOT_DB_PATH": os.path.join(data_dir, "snapshots.db"),
+        "AD_CLASSIFIER_ENABLED": "true" if use_local_classifier else "false",
+    })
+    return chromedriver_path
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app_server(log_path, timeout=60):
+    """Inicia `streamlit run app.py` em uma porta livre e espera o health check. Retorna (processo, url)."""
+    port = _free_port()
+    command = [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true", "--server.port", str(port),
+               "--server.address", "127.0.0.1", "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"]
+    log_file = open(log_path, "ab")
+    process = subprocess.Popen(command, cwd=os.path.dirname(APP_PATH), stdout=log_file, stderr=subprocess.STDOUT)
+    log_file.close()
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"O servidor Streamlit encerrou ao iniciar (código {process.returncode}). Veja {log_path}.")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=2) as response:
+                if response.status == 200:
+                    return process, url
+        except OSError:
+            pass
+        time.sleep(0.5)
+    stop_app_server(process)
+    raise RuntimeError(f"O servidor Streamlit não respondeu em {timeout:.0f}s. Veja {log_path}.")
+
+
+def stop_app_server(process):
+    """Encerra o servidor e os descendentes dele (chromedriver e Chrome do app que tenham ficado abertos)."""
+    descendants = process_tree_pids(process.pid)[1:] if os.path.exists(f"/proc/{process.pid}") else []
+    process.terminate()
+    try:
+        process.wait(15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    for pid in descendants:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+class ResourceSampler:
+    """Amostra periodicamente o RSS da árvore de processos de `pid` e a quantidade de processos do Chrome nela."""
+
+    def __init__(self, interval=0.5, pid=None):
+        self.interval = interval
+        self.pid = pid
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append((process_tree_rss_mb(self.pid), count_descendants_named("chrome", self.pid)))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        rss = [sample[0] for sample in self.samples if sample[0] is not None]
+        chrome = [sample[1] for sample in self.samples if sample[1] is not None]
+        return {
+            "rss_mb_peak": round(max(rss), 1) if rss else None,
+            "rss_mb_mean": round(sum(rss) / len(rss), 1) if rss else None,
+            "chrome_processes_peak": max(chrome) if chrome else None,
+        }
+
+
+def create_client_driver(chromedriver_path):
+    """Chrome headless do analista simulado (cliente do app, fora da árvore de processos do servidor)."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+
+    options = webdriver.ChromeOptions()
+    for argument in ("--headless=new", "--no-sandbox", "--disable-dev-shm-usage", "--window-size=1600,1200"):
+        options.add_argument(argument)
+    return webdriver.Chrome(service=ChromeService(executable_path=chromedriver_path), options=options)
+
+
+def _widget(driver, key, selector):
+    # O Streamlit marca o contêiner de cada widget com a classe st-key-<key>
+    return driver.find_element("css selector", f".st-key-{key} {selector}")
+
+
+def run_session(driver, url, session_id, timeout):
+    """
+    Uma sessão de analista: abre o app no navegador, preenche o lead e clica em 'Analisar Lead Agora!'.
+    A latência vai do clique até a pontuação aparecer na página. Retorna o resultado medido.
+    """
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    result = {"session": session_id, "latency_s": None, "error": None}
+    try:
+        driver.get(url)
+        wait = WebDriverWait(driver, timeout)
+        wait.until(lambda d: d.find_elements("css selector", ".st-key-calculateButton button"))
+        for key in ("reuse_recent", "auto_watch"):
+            if _widget(driver, key, "input").is_selected():
+                _widget(driver, key, "label").click()
+        for key, value in (("instagram_username", f"loadtest_{session_id}"), ("domain", f"loadtest{session_id}.com.br"),
+                           ("cnpj", str(10 ** 13 + session_id))):
+            field = _widget(driver, key, "input")
+            field.send_keys(value)
+            field.send_keys(Keys.ENTER)
+
+        started_at = time.perf_counter()
+        _widget(driver, "calculateButton", "button").click()
+        wait.until(lambda d: d.find_elements("xpath", "//*[@data-testid='stMetricLabel'][contains(., 'Pontuação Total')]")
+                   or d.find_elements("css selector", "[data-testid='stException']")
+                   or any(marker in alert.text for alert in d.find_elements("css selector", "[data-testid='stAlert']")
+                          for marker in _ERROR_MARKERS))
+        result["latency_s"] = time.perf_counter() - started_at
+
+        exceptions = driver.find_elements("css selector", "[data-testid='stException']")
+        failures = [alert.text for alert in driver.find_elements("css selector", "[data-testid='stAlert']")
+                    if any(marker in alert.text for marker in _ERROR_MARKERS)]
+        if exceptions:
+            result["error"] = f"exception: {exceptions[0].text[:200]}"
+        elif failures:
+            result["error"] = f"erro exibido: {failures[0][:200]}"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+    return result
+
+
+def run_user(url, session_ids, timeout, chromedriver_path):
+    """Um analista simulado: um Chrome cliente executando suas sessões em sequência (cada carga da página é uma sessão nova)."""
+    try:
+        driver = create_client_driver(chromedriver_path)
+    except Exception as e:
+        return [{"session": session_id, "latency_s": None, "error": f"cliente: {type(e).__name__}: {str(e).strip()}"} for session_id in session_ids]
+    try:
+        return [run_session(driver, url, session_id, timeout) for session_id in session_ids]
+    finally:
+        driver.quit()
+
+
+def _percentile(values, percentile):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(round(percentile / 100 * (len(ordered) - 1))), len(ordered) - 1)], 2)
+
+
+def run_level(concurrency, sessions_per_worker, timeout, first_session_id, sample_interval, chromedriver_path, log_path):
+    """Inicia um servidor do app, executa `concurrency` analistas simultâneos contra ele e o encerra."""
+    total_sessions = concurrency * sessions_per_worker
+    user_sessions = [list(range(first_session_id + user * sessions_per_worker, first_session_id + (user + 1) * sessions_per_worker))
+                     for user in range(concurrency)]
+    server, url = start_app_server(log_path)
+    logger.info(f"Nível {concurrency}: servidor {url} (pid {server.pid}), {total_sessions} sessões, {concurrency} simultâneas.")
+    try:
+        started_at = time.perf_counter()
+        with ResourceSampler(sample_interval, pid=server.pid) as sampler:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="analyst") as executor:
+                results = [result for user_results in executor.map(lambda session_ids: run_user(url, session_ids, timeout, chromedriver_path), user_sessions)
+                           for result in user_results]
+        elapsed = time.perf_counter() - started_at
+    finally:
+        stop_app_server(server)
+
+    latencies = [result["latency_s"] for result in results if result["latency_s"] is not None and not result["error"]]
+    errors = [result["error"] for result in results if result["error"]]
+    return {
+        "concurrency": concurrency,
+        "sessions": total_sessions,
+        "elapsed_s": round(elapsed, 1),
+        "throughput_leads_per_min": round(len(latencies) / elapsed * 60, 2) if elapsed else None,
+        "latency_s_p50": _percentile(latencies, 50),
+        "latency_s_p90": _percentile(latencies, 90),
+        "latency_s_p95": _percentile(latencies, 95),
+        "latency_s_p99": _percentile(latencies, 99),
+        "latency_s_max": round(max(latencies), 2) if latencies else None,
+        "error_rate": round(len(errors) / total_sessions, 4),
+        "error_samples": sorted(set(errors))[:5],
+        **sampler.summary(),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(APP_PATH)).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare_with_baseline(report, baseline):
+    """Diferenças por nível de concorrência entre este relatório e um anterior (valores positivos = piorou)."""
+    previous_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    comparison = []
+    for level in report["levels"]:
+        previous = previous_levels.get(level["concurrency"])
+        if not previous:
+            continue
+        row = {"concurrency": level["concurrency"]}
+        for key in ("latency_s_p50", "latency_s_p95", "rss_mb_peak", "chrome_processes_peak", "error_rate"):
+            if level.get(key) is not None and previous.get(key) is not None:
+                row[f"{key}_delta"] = round(level[key] - previous[key], 4)
+        comparison.append(row)
+    return {"baseline_revision": baseline.get("git_revision"), "levels": comparison}
+
+
+def format_report(report):
+    lines = [
+        f"Relatório de capacidade ({report['git_revision'] or 'revisão desconhecida'})",
+        "",
+        "| Sessões simultâneas | p50 (s) | p95 (s) | p99 (s) | Leads/min | Erros | RSS pico (MB) | Chrome pico |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for level in report["levels"]:
+        lines.append(
+            f"| {level['concurrency']} | {level['latency_s_p50']} | {level['latency_s_p95']} | {level['latency_s_p99']} | "
+            f"{level['throughput_leads_per_min']} | {level['error_rate']:.1%} | {level['rss_mb_peak']} | {level['chrome_processes_peak']} |"
+        )
+    if report.get("comparison"):
+        lines += ["", f"Comparação com {report['comparison']['baseline_revision']}:"]
+        for row in report["comparison"]["levels"]:
+            deltas = ", ".join(f"{key.replace('_delta', '')}: {value:+}" for key, value in row.items() if key != "concurrency")
+            lines.append(f"- {row['concurrency']} sessões: {deltas}")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Teste de carga multi-sessão do app Streamlit.")
+    parser.add_argument("--levels", default="1,2,4,8", help="Níveis de concorrência, separados por vírgula.")
+    parser.add_argument("--sessions-per-worker", type=int, default=1, help="Sessões executadas em sequência por usuário simulado.")
+    parser.add_argument("--timeout", type=float, default=300, help="Tempo máximo de espera por uma sessão no navegador (s).")
+    parser.add_argument("--page-latency", type=float, default=0.5, help="Latência simulada das páginas de anúncios (s).")
+    parser.add_argument("--receitaws-latency", type=float, default=0.3)
+    parser.add_argument("--openai-latency", type=float, default=0.8)
+    parser.add_argument("--local-classifier", action="store_true", help="Mantém o classificador local ativo (padrão: apenas OpenAI).")
+    parser.add_argument("--chromedriver", help="Caminho do chromedriver local (padrão: CHROMEDRIVER_PATH ou PATH).")
+    parser.add_argument("--sample-interval", type=float, default=0.5)
+    parser.add_argument("--cooldown", type=float, default=5, help="Pausa entre níveis para o Chrome encerrar (s).")
+    parser.add_argument("--output", help="Arquivo JSON do relatório.")
+    parser.add_argument("--baseline", help="Relatório JSON anterior para comparação.")
+    args = parser.parse_args()
+
+    stub_server = start_stub_services(args.page_latency, args.receitaws_latency, args.openai_latency)
+    data_dir = tempfile.mkdtemp(prefix="load_test_")
+    chromedriver = configure_environment(f"http://127.0.0.1:{stub_server.server_address[1]}", data_dir, args.local_classifier, args.chromedriver)
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    report = {
+        "generated_at": time.time(),
+        "git_revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "levels": [],
+    }
+    next_session_id = random.randint(0, 10 ** 6) * 1000
+    for concurrency in levels:
+        report["levels"].append(run_level(concurrency, args.sessions_per_worker, args.timeout, next_session_id, args.sample_interval,
+                                          chromedriver, os.path.join(data_dir, f"streamlit_{concurrency}.log")))
+        next_session_id += concurrency * args.sessions_per_worker
+        time.sleep(args.cooldown)
+    stub_server.shutdown()
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            report["comparison"] = compare_with_baseline(report, json.load(baseline_file))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2, ensure_ascii=False)
+    print(format_report(report))
@@ -0,0 +1,68 @@
+"""
+Medições de processos via /proc (Linux): memória residente e descendentes (chromedriver, Chrome).
+
+Usado pelo executor em lote (limite de memória por worker) e pelo teste de carga. Em sistemas sem
+/proc as funções retornam None.
+"""
+import os
+
+
+def _process_rss_kb(pid):
+    with open(f"/proc/{pid}/status") as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _child_pids(pid):
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as children_file:
+                children.extend(int(child) for child in children_file.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def process_tree_pids(pid=None):
+    """Lista o processo e todos os seus descendentes."""
+    pid = pid or os.getpid()
+    pids = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(_child_pids(current))
+    return pids
+
+
+def process_tree_rss_mb(pid=None):
+    """RSS total (MB) do processo e de todos os descendentes. None se /proc não estiver disponível."""
+    pid = pid or os.getpid()
+    if not os.path.exists(f"/proc/{pid}/status"):
+        return None
+    total_kb = 0
+    for current in process_tree_pids(pid):
+        try:
+            total_kb += _process_rss_kb(current)
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def count_descendants_named(name, pid=None):
+    """Conta os descendentes cujo nome de processo contém `name` (ex.: 'chrome'). None sem /proc."""
+    pid = pid or os.getpid()
+    if not os.path.exists(f"/proc/{pid}/status"):
+        return None
+    total = 0
+    for current in process_tree_pids(pid)[1:]:
+        try:
+            with open(f"/proc/{current}/comm") as comm_file:
+                if name in comm_file.read():
+                    total += 1
+        except OSError:
+            continue
+    return total
@@ -0,0 +1,126 @@
+"""
+Lógica de pontuação e qualificação de leads, compartilhada pela interface Streamlit e pelas
+execuções fora dela (watchlist, API).
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Lógica de Pontuação e Qualificação ---
+CRITERIA_POINTS = {
+    # 1. Faixa de Faturamento
+    "faturamento_ate_100k": -100,
+    "faturamento_100_200k": -100,
+    "faturamento_200_400k": 0,
+    "faturamento_401k_1M": 30,
+    "faturamento_1M_4M": 30,
+    # 2. Produto de Interesse
+    "interesse_assessoria": 30,
+    "interesse_estruturacao": 10,
+    "interesse_alavancagem": 0,
+    # 3. Perfil do Contato
+    "perfil_nome_completo": 30,
+    "perfil_linkedin": 30,
+    "perfil_cargo_estrategico": 30,
+    "perfil_cargo_tatico": 20,
+    "perfil_cargo_operacional": 0,
+    # 4. Qualidade do Contato
+    "contato_email_corp": 10,
+    "contato_email_pessoal": 0,
+    # 5. Estrutura Digital
+    "digital_site_funcional": 30,
+    "digital_site_fora_ar": -20,
+    "digital_produto_sinergia": 20,
+    # 6. Redes Sociais
+    "social_insta_site": 5,
+    "social_insta_google": 10,
+    "social_insta_5k": 20,
+    "social_sem_presenca": -20,
+    # 7. Validação da Empresa
+    "validacao_cnpj_localizado": 10,
+    "validacao_pessoa_qsa": 30,
+    "validacao_nome_generico": -30,
+    # 8. Urgência
+    "urgencia_imediata": 20,
+    "urgencia_3_meses": 10,
+    "urgencia_nao_informada": 0,
+    # 9. Investimento Atual
+    "investimento_google_meta": 30,
+    "investimento_google": 20,
+    "investimento_meta": 20,
+    # 10. Confirmações Manuais
+    "manual_verificado_maps": 20,
+    "manual_redirecionado_assessoria": 15
+}
+
+def calculate_score(checklist_data, verification_results):
+    total = 0
+    logger.info(f"Calculando pontuação com checklist: {checklist_data}")
+    logger.info(f"Resultados da verificação para pontuação: {verification_results}")
+
+    for key, value in checklist_data.items():
+        if key in CRITERIA_POINTS and value:
+            total += CRITERIA_POINTS.get(key, 0)
+            logger.info(f"Checklist item: \"{key}\" (Valor: {value}) adicionou {CRITERIA_POINTS.get(key, 0)}. Total parcial: {total}")
+
+    logger.info(f"Pontuação após checklist manual: {total}")
+
+    if verification_results.get("qsa_status") == "found":
+        total += CRITERIA_POINTS["validacao_cnpj_localizado"]
+        logger.info(f"QSA encontrado, adicionado {CRITERIA_POINTS['validacao_cnpj_localizado']} por CNPJ localizado. Total parcial: {total}")
+        qsa_data = verification_results.get("qsa_data", {})
+        if qsa_data and qsa_data.get("qsa") and len(qsa_data.get("qsa", [])) > 0:
+            total += CRITERIA_POINTS["validacao_pessoa_qsa"]
+            logger.info(f"Pessoas no QSA, adicionado {CRITERIA_POINTS['validacao_pessoa_qsa']}. Total parcial: {total}")
+
+    google_active = verification_results.get("google_ads_status") == "active"
+    fb_active = verification_results.get("facebook_ads_status") == "active"
+
+    if google_active and fb_active:
+        total += CRITERIA_POINTS["investimento_google_meta"]
+        logger.info(f"Google e Meta Ads ativos, adicionado {CRITERIA_POINTS['investimento_google_meta']}. Total parcial: {total}")
+    elif google_active:
+        total += CRITERIA_POINTS["investimento_google"]
+        logger.info(f"Google Ads ativo, adicionado {CRITERIA_POINTS['investimento_google']}. Total parcial: {total}")
+    elif fb_active:
+        total += CRITERIA_POINTS["investimento_meta"]
+        logger.info(f"Meta Ads ativo, adicionado {CRITERIA_POINTS['investimento_meta']}. Total parcial: {total}")
+
+    logger.info(f"Pontuação final após verificações automáticas: {total}")
+    return total
+
+def determine_qualification(score, valor_inicial, valor_atual):
+    qualification = {
+        "status": "descartar",
+        "message": "🔴 Descartar Lead",
+        "teto": 0,
+        "show_teto": False,
+        "alert": None
+    }
+    teto = 0
+    valor_inicial_num = float(valor_inicial) if valor_inicial else 0
+    valor_atual_num = float(valor_atual) if valor_atual else 0
+
+    if score >= 130:
+        teto = valor_inicial_num * 1.8
+        qualification["status"] = "comprar"
+        qualification["message"] = f"🟢 COMPRE JÁ liberado (Teto Sugerido: R$ {teto:.2f})"
+        qualification["show_teto"] = True
+    elif score >= 100:
+        teto = valor_inicial_num * 1.3
+        qualification["status"] = "acompanhar_alto"
+        qualification["message"] = f"🟡 Acompanhar (Teto Sugerido: R$ {teto:.2f})"
+        qualification["show_teto"] = True
+    elif score >= 80:
+        teto = valor_inicial_num
+        qualification["status"] = "acompanhar_baixo"
+        qualification["message"] = f"⚠️ Acompanhar (Teto Sugerido: R$ {teto:.2f})"
+        qualification["show_teto"] = True
+
+    qualification["teto"] = teto
+
+    if valor_atual_num > teto and score >= 80 and teto > 0:
+        qualification["alert"] = f"❗ Valor atual (R$ {valor_atual_num:.2f}) ultrapassou teto sugerido (R$ {teto:.2f}). Reavaliar risco!"
+
+    logger.info(f"Resultado da qualificação: {qualification}")
+    return qualification
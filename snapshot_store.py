@@ -0,0 +1,325 @@
+"""
+Armazenamento comprimido das páginas raspadas (Facebook Ads Library / Google Ads Transparency).
+
+Cada texto extraído é guardado uma única vez (endereçado pelo hash SHA-256 do conteúdo,
+comprimido com zlib) em um banco SQLite local, e cada captura registra plataforma, consulta
+e horário. Isso permite reclassificar leads antigos com um prompt/classificador novo sem
+abrir o Chrome novamente (ver `replay_snapshots`).
+"""
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DB_PATH = os.getenv("SNAPSHOT_DB_PATH", "snapshots.db")
+# Retenção: capturas mais antigas que N dias ou além das N mais recentes são removidas (0 desativa)
+SNAPSHOT_RETENTION_DAYS = float(os.getenv("SNAPSHOT_RETENTION_DAYS", "90"))
+SNAPSHOT_MAX_ENTRIES = int(os.getenv("SNAPSHOT_MAX_ENTRIES", "50000"))
+COMPRESSION_LEVEL = 9
+RETENTION_CHECK_EVERY = 100 # Aplica a retenção a cada N capturas salvas
+
+_write_lock = threading.Lock()
+_initialized_paths = set()
+_saves_since_retention = 0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_blobs (
+    content_hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    compressed_size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS page_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform TEXT NOT NULL,
+    query TEXT NOT NULL,
+    content_hash TEXT NOT NULL REFERENCES page_blobs(content_hash),
+    captured_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_platform_query ON page_snapshots(platform, query, captured_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_captured_at ON page_snapshots(captured_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_hash ON page_snapshots(content_hash);
+CREATE TABLE IF NOT EXISTS page_classifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform TEXT NOT NULL,
+    query TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    verdict INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    confidence REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_classifications_source ON page_classifications(source, created_at);
+CREATE INDEX IF NOT EXISTS idx_classifications_hash ON page_classifications(content_hash);
+"""
+
+# Origens de veredito usadas como rótulo de treino (vereditos do classificador local não realimentam o treino)
+LABEL_SOURCES = ("openai", "manual")
+
+
+def content_hash(conteudo):
+    """Retorna o hash SHA-256 (hex) usado para endereçar o conteúdo de uma página."""
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def _connect(db_path=None):
+    path = db_path or SNAPSHOT_DB_PATH
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if path not in _initialized_paths:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized_paths.add(path)
+    return conn
+
+
+def save_snapshot(platform, query, conteudo, captured_at=None, db_path=None):
+    """Guarda o texto raspado e retorna seu hash. Conteúdo repetido não é duplicado, apenas a captura é registrada."""
+    global _saves_since_retention
+    if not conteudo:
+        return None
+    digest = content_hash(conteudo)
+    captured_at = captured_at or time.time()
+    with _write_lock:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                exists = conn.execute("SELECT 1 FROM page_blobs WHERE content_hash = ?", (digest,)).fetchone()
+                if not exists:
+                    raw = conteudo.encode("utf-8")
+                    data = zlib.compress(raw, COMPRESSION_LEVEL)
+                    conn.execute(
+                        "INSERT INTO page_blobs (content_hash, data, size, compressed_size, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (digest, data, len(raw), len(data), captured_at)
+                    )
+                conn.execute(
+                    "INSERT INTO page_snapshots (platform, query, content_hash, captured_at) VALUES (?, ?, ?, ?)",
+                    (platform, query, digest, captured_at)
+                )
+        finally:
+            conn.close()
+        _saves_since_retention += 1
+        run_retention = _saves_since_retention >= RETENTION_CHECK_EVERY
+        if run_retention:
+            _saves_since_retention = 0
+    if run_retention:
+        apply_retention(db_path=db_path)
+    logger.info(f"Snapshot salvo para {query} ({platform}). Hash: {digest[:12]}{' (deduplicado)' if exists else ''}")
+    return digest
+
+
+def load_content(digest, db_path=None):
+    """Retorna o texto original de um snapshot a partir do hash, ou None se não existir."""
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT data FROM page_blobs WHERE content_hash = ?", (digest,)).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    return zlib.decompress(row["data"]).decode("utf-8")
+
+
+def list_snapshots(platform=None, query=None, since=None, until=None, latest_only=False, limit=None, db_path=None):
+    """Lista capturas (sem o conteúdo) filtradas por plataforma, consulta e intervalo de tempo, das mais recentes para as mais antigas."""
+    conditions = []
+    params = []
+    if platform:
+        conditions.append("platform = ?")
+        params.append(platform)
+    if query:
+        conditions.append("query = ?")
+        params.append(query)
+    if since:
+        conditions.append("captured_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("captured_at <= ?")
+        params.append(until)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    if latest_only:
+        sql = (
+            "SELECT s.id, s.platform, s.query, s.content_hash, s.captured_at FROM page_snapshots s "
+            f"JOIN (SELECT platform, query, MAX(captured_at) AS captured_at FROM page_snapshots {where} GROUP BY platform, query) m "
+            "ON s.platform = m.platform AND s.query = m.query AND s.captured_at = m.captured_at "
+            "ORDER BY s.captured_at DESC"
+        )
+    else:
+        sql = f"SELECT id, platform, query, content_hash, captured_at FROM page_snapshots {where} ORDER BY captured_at DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+
+    conn = _connect(db_path)
+    try:
+        return [dict(row) for row in conn.execute(sql, params).fetchall()]
+    finally:
+        conn.close()
+
+
+def apply_retention(max_age_days=None, max_entries=None, db_path=None):
+    """Remove capturas fora dos limites de retenção e os conteúdos que deixaram de ser referenciados."""
+    max_age_days = SNAPSHOT_RETENTION_DAYS if max_age_days is None else max_age_days
+    max_entries = SNAPSHOT_MAX_ENTRIES if max_entries is None else max_entries
+    removed = 0
+    with _write_lock:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                if max_age_days and max_age_days > 0:
+                    cutoff = time.time() - max_age_days * 86400
+                    removed += conn.execute("DELETE FROM page_snapshots WHERE captured_at < ?", (cutoff,)).rowcount
+                if max_entries and max_entries > 0:
+                    removed += conn.execute(
+                        "DELETE FROM page_snapshots WHERE id NOT IN (SELECT id FROM page_snapshots ORDER BY captured_at DESC LIMIT ?)",
+                        (max_entries,)
+                    ).rowcount
+                orphans = conn.execute(
+                    "DELETE FROM page_blobs WHERE content_hash NOT IN (SELECT DISTINCT content_hash FROM page_snapshots)"
+                ).rowcount
+                conn.execute("DELETE FROM page_classifications WHERE content_hash NOT IN (SELECT content_hash FROM page_blobs)")
+        finally:
+            conn.close()
+    if removed or orphans:
+        logger.info(f"Retenção de snapshots aplicada: {removed} capturas e {orphans} conteúdos removidos.")
+    return {"snapshots_removed": removed, "blobs_removed": orphans}
+
+
+def record_classification(platform, query, digest, verdict, source, confidence=None, db_path=None):
+    """Registra o veredito (anúncios ativos ou não) dado a um conteúdo, com a origem: 'openai', 'local' ou 'manual'."""
+    with _write_lock:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO page_classifications (platform, query, content_hash, verdict, source, confidence, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (platform, query, digest, int(bool(verdict)), source, confidence, time.time())
+                )
+        finally:
+            conn.close()
+
+
+def labelled_pages(platform=None, sources=LABEL_SOURCES, db_path=None):
+    """
+    Retorna os conteúdos rotulados para treino: lista de dicts com platform, query, content_hash, text e verdict.
+
+    Cada conteúdo aparece uma vez por plataforma, com o veredito mais recente entre as `sources` informadas.
+    """
+    placeholders = ", ".join("?" for _ in sources)
+    params = list(sources)
+    platform_filter = ""
+    if platform:
+        platform_filter = "AND c.platform = ?"
+        params.append(platform)
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT c.platform, c.query, c.content_hash, c.verdict, b.data FROM page_classifications c "
+            "JOIN page_blobs b ON b.content_hash = c.content_hash "
+            f"WHERE c.source IN ({placeholders}) {platform_filter} ORDER BY c.created_at",
+            params
+        ).fetchall()
+    finally:
+        conn.close()
+    latest = {}
+    for row in rows:
+        latest[(row["platform"], row["content_hash"])] = row
+    return [
+        {
+            "platform": row["platform"],
+            "query": row["query"],
+            "content_hash": row["content_hash"],
+            "text": zlib.decompress(row["data"]).decode("utf-8"),
+            "verdict": bool(row["verdict"]),
+        }
+        for row in latest.values()
+    ]
+
+
+def store_stats(db_path=None):
+    """Resumo do armazenamento: número de capturas, conteúdos únicos e taxa de compressão."""
+    conn = _connect(db_path)
+    try:
+        snapshots = conn.execute("SELECT COUNT(*) FROM page_snapshots").fetchone()[0]
+        row = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(compressed_size), 0) FROM page_blobs").fetchone()
+    finally:
+        conn.close()
+    blobs, size, compressed = row[0], row[1], row[2]
+    return {
+        "snapshots": snapshots,
+        "unique_pages": blobs,
+        "raw_bytes": size,
+        "compressed_bytes": compressed,
+        "compression_ratio": round(size / compressed, 2) if compressed else None
+    }
+
+
+def replay_snapshots(platform=None, query=None, since=None, until=None, latest_only=True, limit=None, analyzer=None, db_path=None):
+    """
+    Reenvia snapshots armazenados para o classificador (por padrão `analyze_ads_with_openai_api`), sem nova raspagem.
+
+    Retorna uma lista de dicts com plataforma, consulta, hash, horário da captura e o novo veredito.
+    Conteúdos idênticos são classificados uma única vez por plataforma/consulta.
+    """
+    if analyzer is None:
+        from verifications_streamlit import analyze_ads_with_openai_api
+        analyzer = analyze_ads_with_openai_api
+
+    snapshots = list_snapshots(platform=platform, query=query, since=since, until=until,
+                               latest_only=latest_only, limit=limit, db_path=db_path)
+    logger.info(f"Replay de {len(snapshots)} snapshots iniciado.")
+    verdicts = {}
+    results = []
+    for snap in snapshots:
+        key = (snap["platform"], snap["query"], snap["content_hash"])
+        if key not in verdicts:
+            conteudo = load_content(snap["content_hash"], db_path=db_path)
+            if conteudo is None:
+                logger.warning(f"Conteúdo do snapshot {snap['id']} não encontrado (hash {snap['content_hash'][:12]}).")
+                continue
+            verdicts[key] = analyzer(snap["platform"], conteudo, snap["query"])
+        results.append({
+            "snapshot_id": snap["id"],
+            "platform": snap["platform"],
+            "query": snap["query"],
+            "content_hash": snap["content_hash"],
+            "captured_at": snap["captured_at"],
+            "has_active_ads": verdicts[key]
+        })
+    logger.info(f"Replay concluído: {len(results)} snapshots, {len(verdicts)} classificações executadas.")
+    return results
+
+
+if __name__ == '__main__':
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gerencia o armazenamento de snapshots das páginas raspadas.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Mostra estatísticas do armazenamento.")
+    sub.add_parser("prune", help="Aplica os limites de retenção.")
+    replay_parser = sub.add_parser("replay", help="Reclassifica snapshots armazenados.")
+    replay_parser.add_argument("--platform", choices=["facebook", "google"])
+    replay_parser.add_argument("--query")
+    replay_parser.add_argument("--since-days", type=float, help="Apenas capturas dos últimos N dias.")
+    replay_parser.add_argument("--all", action="store_true", help="Inclui todas as capturas, não apenas a mais recente de cada consulta.")
+    replay_parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(store_stats(), indent=2))
+    elif args.command == "prune":
+        print(json.dumps(apply_retention(), indent=2))
+    else:
+        since = time.time() - args.since_days * 86400 if args.since_days else None
+        replayed = replay_snapshots(platform=args.platform, query=args.query, since=since,
+                                    latest_only=not args.all, limit=args.limit)
+        print(json.dumps(replayed, indent=2, ensure_ascii=False))
@@ -0,0 +1,122 @@
+"""
+Medição reprodutível do custo de partida do app (cold start), em processos Python novos.
+
+Métricas (mediana de `--runs` processos):
+    import_s          tempo de `import verifications_streamlit`, pago pelo script antes de desenhar a página
+    first_paint_s     primeira execução do app.py (AppTest), ou seja, até a página ficar pronta
+    backend_ready_s   import + cliente OpenAI + selenium.webdriver + classificador local: custo fixo
+                      que o primeiro lead paga antes de abrir o Chrome, se o aquecimento ainda não o fez
+
+`--repo` permite medir outra cópia da árvore (ex.: um `git worktree` de uma versão anterior) com o
+mesmo interpretador, para comparar antes e depois:
+    git worktree add /tmp/antes <commit>
+    python startup_benchmark.py --repo /tmp/antes --output antes.json
+    python startup_benchmark.py --output depois.json --baseline antes.json
+"""
+import os
+import sys
+import json
+import tempfile
+import statistics
+import subprocess
+
+_IMPORT_SCRIPT = """
+import time
+started_at = time.perf_counter()
+import verifications_streamlit
+print(time.perf_counter() - started_at)
+"""
+
+_BACKEND_SCRIPT = """
+import time
+started_at = time.perf_counter()
+import verifications_streamlit
+if hasattr(verifications_streamlit, "get_openai_client"):
+    verifications_streamlit.get_openai_client()
+import selenium.webdriver
+try:
+    import ad_classifier
+    ad_classifier.load_model()
+except ImportError:
+    pass
+print(time.perf_counter() - started_at)
+"""
+
+_FIRST_PAINT_SCRIPT = """
+import time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=120)
+started_at = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - started_at
+if at.exception:
+    raise SystemExit(f"app.py falhou: {at.exception[0].message}")
+print(elapsed)
+"""
+
+METRICS = (("import_s", _IMPORT_SCRIPT), ("first_paint_s", _FIRST_PAINT_SCRIPT), ("backend_ready_s", _BACKEND_SCRIPT))
+
+
+def _environment(data_dir):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "startup-benchmark")
+    # Caminho fixo: o aquecimento não consulta o webdriver-manager pela rede durante a medição
+    env.setdefault("CHROMEDRIVER_PATH", "chromedriver")
+    env.update({
+        "LEAD_HISTORY_DB_PATH": os.path.join(data_dir, "lead_history.db"),
+        "WATCHLIST_DB_PATH": os.path.join(data_dir, "watchlist.db"),
+        "SNAPSHOT_DB_PATH": os.path.join(data_dir, "snapshots.db"),
+    })
+    return env
+
+
+def _run_script(script, repo, env):
+    completed = subprocess.run([sys.executable, "-c", script], cwd=repo, env=env, capture_output=True, text=True, timeout=300)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Medição falhou em {repo}:\n{completed.stderr[-2000:]}")
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(repo=None, runs=5):
+    """Roda cada métrica em `runs` processos novos e retorna as medianas (e os valores brutos)."""
+    repo = os.path.abspath(repo or os.path.dirname(os.path.abspath(__file__)))
+    report = {"repo": repo, "python": sys.version.split()[0], "runs": runs, "metrics": {}}
+    with tempfile.TemporaryDirectory(prefix="startup_benchmark_") as data_dir:
+        env = _environment(data_dir)
+        for name, script in METRICS:
+            samples = [_run_script(script, repo, env) for _ in range(runs)]
+            report["metrics"][name] = {"median": round(statistics.median(samples), 3), "samples": [round(s, 3) for s in samples]}
+    return report
+
+
+def format_report(report, baseline=None):
+    lines = [f"{'métrica':<18}{'mediana (s)':>12}" + (f"{'antes (s)':>12}{'variação':>10}" if baseline else "")]
+    for name, values in report["metrics"].items():
+        line = f"{name:<18}{values['median']:>12.3f}"
+        previous = (baseline or {}).get("metrics", {}).get(name)
+        if previous:
+            change = (values["median"] - previous["median"]) / previous["median"] * 100 if previous["median"] else 0.0
+            line += f"{previous['median']:>12.3f}{change:>+9.0f}%"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mede o tempo de partida do app em processos novos.")
+    parser.add_argument("--repo", help="Diretório da árvore a medir (padrão: este).")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Arquivo JSON para gravar o resultado.")
+    parser.add_argument("--baseline", help="Resultado JSON anterior para comparação.")
+    args = parser.parse_args()
+
+    result = measure(args.repo, args.runs)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(result, output_file, indent=2)
+    baseline_report = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline_report = json.load(baseline_file)
+    print(format_report(result, baseline_report))
@@ -1,22 +1,20 @@
 """
 Este arquivo contém as funções de verificação adaptadas para o Streamlit (V2),
 utilizando a API da OpenAI diretamente para análise de anúncios e webdriver-manager para Selenium.
+
+Selenium, webdriver-manager e openai são importados apenas no primeiro uso (importar este módulo
+é barato), e o cliente OpenAI e o caminho do chromedriver são resolvidos uma única vez por processo.
+`start_warm_up()` antecipa essa preparação em segundo plano.
 """
 import os
 import time
 import logging
+import threading
 import requests
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchElementException
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from webdriver_manager.chrome import ChromeDriverManager
+import snapshot_store
+import ad_classifier
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -31,13 +29,87 @@ if not OPENAI_API_KEY:
 else:
     os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
+# Caminho fixo do chromedriver (opcional). Sem ele, o webdriver-manager resolve o caminho uma vez por processo.
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH")
+
 client = None
-if OPENAI_API_KEY:
-    client = OpenAI(api_key=OPENAI_API_KEY)
+_chromedriver_path = None
+_backend_lock = threading.Lock()
+_warm_up_thread = None
+
+def get_openai_client():
+    """Retorna o cliente OpenAI do processo, criando-o (e importando openai) no primeiro uso. None sem chave."""
+    global client
+    if client is None and OPENAI_API_KEY:
+        with _backend_lock:
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(api_key=OPENAI_API_KEY)
+                logger.info("Cliente OpenAI inicializado.")
+    return client
+
+def get_chromedriver_path():
+    """Resolve o caminho do chromedriver uma única vez por processo (CHROMEDRIVER_PATH ou webdriver-manager)."""
+    global _chromedriver_path
+    if _chromedriver_path is None:
+        with _backend_lock:
+            if _chromedriver_path is None:
+                if CHROMEDRIVER_PATH:
+                    _chromedriver_path = CHROMEDRIVER_PATH
+                else:
+                    from webdriver_manager.chrome import ChromeDriverManager
+                    logger.info("Resolvendo ChromeDriver com webdriver-manager.")
+                    _chromedriver_path = ChromeDriverManager().install()
+                logger.info(f"ChromeDriver resolvido em: {_chromedriver_path}")
+    return _chromedriver_path
+
+def warm_up():
+    """Importa os backends pesados, resolve o chromedriver, cria o cliente OpenAI e carrega o classificador local. Erros são apenas registrados."""
+    started_at = time.monotonic()
+    try:
+        import selenium.webdriver # noqa: F401
+        get_chromedriver_path()
+        get_openai_client()
+        # Carregar o modelo importa o scikit-learn; fora da renderização da página, ou no primeiro classify_ads
+        ad_classifier.load_model()
+        logger.info(f"Aquecimento dos backends concluído em {time.monotonic() - started_at:.1f}s.")
+    except Exception as e:
+        logger.error(f"Erro no aquecimento dos backends: {e}", exc_info=True)
+
+def start_warm_up():
+    """Dispara `warm_up()` em uma thread de fundo (uma vez por processo) e retorna a thread."""
+    global _warm_up_thread
+    with _backend_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up, name="backend-warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
 
 # --- Funções de Extração (Selenium com Webdriver-Manager) ---
-def setup_selenium_driver():
+# URLs específicas para Brasil e anúncios ativos; podem ser trocadas por variáveis de ambiente (ex.: serviços locais no teste de carga)
+FACEBOOK_ADS_LIBRARY_URL = os.getenv("FACEBOOK_ADS_LIBRARY_URL", "https://www.facebook.com/ads/library/?active_status=active&ad_type=all&country=BR&is_targeted_country=false&media_type=all&q={query}&search_type=keyword_unordered")
+GOOGLE_ADS_TRANSPARENCY_URL = os.getenv("GOOGLE_ADS_TRANSPARENCY_URL", "https://adstransparency.google.com/?region=BR&domain={query}")
+RECEITAWS_URL = os.getenv("RECEITAWS_URL", "https://www.receitaws.com.br/v1/cnpj/{cnpj}")
+# Seletor que espera por qualquer um dos textos indicativos ou o rodapé da página do Google
+GOOGLE_READY_XPATH = "//body[contains(.,'anúncio') or contains(.,'Nenhum anúncio') or contains(.,'Todos os formatos')] | //footer | //div[contains(text(), 'Anunciante verificado')]"
+FB_RENDER_WAIT_SECONDS = 5
+GOOGLE_RENDER_WAIT_SECONDS = 10
+
+# Modo multi-aba: um único Chrome por lead, com Facebook e Google carregando em abas paralelas
+SELENIUM_MULTI_TAB = os.getenv("SELENIUM_MULTI_TAB", "true").lower() in ("1", "true", "sim", "yes")
+# Impede que o Chrome reduza a prioridade da aba em segundo plano enquanto a outra é lida
+BACKGROUND_TAB_ARGUMENTS = [
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+]
+
+def setup_selenium_driver(extra_arguments=None):
     """Configura e retorna uma instância do WebDriver do Selenium usando webdriver-manager."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+
     chrome_options = ChromeOptions()
     chrome_options.add_argument("--headless=new") # Modo headless moderno
     chrome_options.add_argument("--no-sandbox")
@@ -47,10 +119,11 @@ def setup_selenium_driver():
     chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.add_argument("--lang=pt-BR")
     chrome_options.add_experimental_option('prefs', {'intl.accept_languages': 'pt-BR,pt'})
+    for argument in extra_arguments or []:
+        chrome_options.add_argument(argument)
 
     try:
-        logger.info("Configurando ChromeDriver com webdriver-manager.")
-        service = ChromeService(ChromeDriverManager().install())
+        service = ChromeService(get_chromedriver_path())
         driver = webdriver.Chrome(service=service, options=chrome_options)
         logger.info("WebDriver do Selenium (com webdriver-manager) inicializado com sucesso.")
         return driver
@@ -58,17 +131,53 @@ def setup_selenium_driver():
         logger.error(f"Erro ao configurar o WebDriver do Selenium com webdriver-manager: {e}.", exc_info=True)
         raise RuntimeError(f"Falha ao inicializar o Selenium WebDriver via webdriver-manager: {e}")
 
-def extract_facebook_ads(instagram_username):
-    """Extrai o conteúdo da Biblioteca de Anúncios do Facebook para um dado usuário do Instagram usando Selenium e webdriver-manager."""
+def _read_page_text(driver, origem, consulta):
+    """Lê o texto do body da aba atual; se vier vazio ou muito curto, retorna a mensagem de erro com o início do HTML."""
+    from selenium.webdriver.common.by import By
+
+    text = driver.find_element(By.TAG_NAME, 'body').text
+    logger.info(f"Extração de {origem} concluída para: {consulta}. Tamanho do texto: {len(text)} caracteres.")
+    if not text.strip() or len(text.strip()) < 200: # Aumentar o limite mínimo
+        logger.warning(f"Texto extraído de {origem} para {consulta} parece muito curto. HTML da página será retornado.")
+        page_html = driver.page_source
+        return f"Erro ao extrair: Conteúdo do corpo do texto muito curto. HTML (primeiros 2000 chars): {page_html[:2000]}"
+    return text
+
+def _recover_page_text_on_timeout(driver, origem, consulta):
+    """Após um timeout, tenta aproveitar o texto parcial já renderizado na aba atual."""
+    from selenium.webdriver.common.by import By
+
+    logger.error(f"Timeout ao esperar pelo conteúdo de {origem} para {consulta}", exc_info=True)
+    try:
+        if driver:
+             page_source_on_timeout = driver.page_source
+             body_text_on_timeout = driver.find_element(By.TAG_NAME, 'body').text
+             if body_text_on_timeout and body_text_on_timeout.strip() and len(body_text_on_timeout.strip()) > 100:
+                 logger.warning(f"Conteúdo parcial do corpo extraído após timeout para {consulta}. Tamanho: {len(body_text_on_timeout)}")
+                 return body_text_on_timeout
+             logger.warning(f"Corpo do texto vazio ou muito curto no timeout, mas page_source tem {len(page_source_on_timeout)} caracteres.")
+             return f"Erro ao extrair: Timeout. HTML no momento do timeout (primeiros 2000 chars): {page_source_on_timeout[:2000]}"
+    except Exception as inner_e:
+         logger.error(f"Erro ao tentar extrair conteúdo parcial após timeout para {consulta}: {inner_e}")
+    return f"Erro ao extrair: Timeout esperando pelo conteúdo principal. Sem conteúdo recuperável."
+
+def extract_facebook_ads(instagram_username, driver=None):
+    """
+    Extrai o conteúdo da Biblioteca de Anúncios do Facebook para um dado usuário do Instagram usando Selenium e webdriver-manager.
+
+    Se `driver` for informado ele é reutilizado (e não é encerrado); senão um Chrome é criado só para esta extração.
+    """
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+
     if not instagram_username:
         return ""
-    driver = None
+    owns_driver = driver is None
     try:
-        # URL atualizada e mais específica para Brasil e anúncios ativos
-        url = f"https://www.facebook.com/ads/library/?active_status=active&ad_type=all&country=BR&is_targeted_country=false&media_type=all&q={instagram_username}&search_type=keyword_unordered"
+        url = FACEBOOK_ADS_LIBRARY_URL.format(query=instagram_username)
         logger.info(f"Acessando Facebook Ads Library para: {instagram_username} com Selenium. URL: {url}")
 
-        driver = setup_selenium_driver()
+        if owns_driver:
+            driver = setup_selenium_driver()
         driver.get(url)
         
         # Aumentar o tempo de espera e refinar seletores
@@ -119,32 +228,12 @@ def extract_facebook_ads(instagram_username):
         
         #wait.until(EC.presence_of_element_located((By.XPATH, main_content_selector)))
         logger.info("Conteúdo principal detectado.")
-        time.sleep(5) # Espera adicional para renderização completa de JS e anúncios
+        time.sleep(FB_RENDER_WAIT_SECONDS) # Espera adicional para renderização completa de JS e anúncios
 
-        text = driver.find_element(By.TAG_NAME, 'body').text
-        logger.info(f"Extração da Facebook Ads Library concluída para: {instagram_username}. Tamanho do texto: {len(text)} caracteres.")
-        if not text.strip() or len(text.strip()) < 200: # Aumentar o limite mínimo
-            logger.warning(f"Texto extraído da Facebook Ads Library para {instagram_username} parece muito curto. HTML da página será retornado.")
-            page_html = driver.page_source
-            return f"Erro ao extrair: Conteúdo do corpo do texto muito curto. HTML (primeiros 2000 chars): {page_html[:2000]}"
-        return text
+        return _read_page_text(driver, "Facebook Ads Library", instagram_username)
 
     except TimeoutException:
-        logger.error(f"Timeout ao esperar pelo conteúdo da Facebook Ads Library para {instagram_username}", exc_info=True)
-        page_source_on_timeout = ""
-        body_text_on_timeout = ""
-        try:
-            if driver:
-                 page_source_on_timeout = driver.page_source
-                 body_text_on_timeout = driver.find_element(By.TAG_NAME, 'body').text
-                 if body_text_on_timeout and body_text_on_timeout.strip() and len(body_text_on_timeout.strip()) > 100:
-                     logger.warning(f"Conteúdo parcial do corpo extraído após timeout para {instagram_username}. Tamanho: {len(body_text_on_timeout)}")
-                     return body_text_on_timeout
-                 logger.warning(f"Corpo do texto vazio ou muito curto no timeout, mas page_source tem {len(page_source_on_timeout)} caracteres.")
-                 return f"Erro ao extrair: Timeout. HTML no momento do timeout (primeiros 2000 chars): {page_source_on_timeout[:2000]}"
-        except Exception as inner_e:
-             logger.error(f"Erro ao tentar extrair conteúdo parcial após timeout para {instagram_username}: {inner_e}")
-        return f"Erro ao extrair: Timeout esperando pelo conteúdo principal. Sem conteúdo recuperável."
+        return _recover_page_text_on_timeout(driver, "Facebook Ads Library", instagram_username)
     except WebDriverException as e:
          logger.error(f"Erro do WebDriver ao extrair anúncios do Facebook para {instagram_username}: {str(e)}", exc_info=True)
          return f"Erro ao extrair: Erro do WebDriver ({type(e).__name__}). Verifique a compatibilidade do ChromeDriver e do Chrome."
@@ -152,19 +241,29 @@ def extract_facebook_ads(instagram_username):
         logger.error(f"Erro inesperado ao extrair anúncios do Facebook para {instagram_username}: {str(e)}", exc_info=True)
         return f"Erro ao extrair: {str(e)}"
     finally:
-        if driver:
+        if driver and owns_driver:
             driver.quit()
 
-def extract_google_ads(domain):
-    """Extrai o conteúdo do Centro de Transparência de Anúncios do Google usando Selenium e webdriver-manager."""
+def extract_google_ads(domain, driver=None):
+    """
+    Extrai o conteúdo do Centro de Transparência de Anúncios do Google usando Selenium e webdriver-manager.
+
+    Se `driver` for informado ele é reutilizado (e não é encerrado); senão um Chrome é criado só para esta extração.
+    """
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     if not domain:
         return ""
-    driver = None
+    owns_driver = driver is None
     try:
-        url = f"https://adstransparency.google.com/?region=BR&domain={domain}"
+        url = GOOGLE_ADS_TRANSPARENCY_URL.format(query=domain)
         logger.info(f"Acessando Google Ads Transparency para: {domain} com Selenium. URL: {url}")
 
-        driver = setup_selenium_driver()
+        if owns_driver:
+            driver = setup_selenium_driver()
         driver.get(url)
 
         # Espera explícita melhorada
@@ -173,39 +272,14 @@ def extract_google_ads(domain):
         
         # Seletor para o corpo da página ou um elemento específico que indica conteúdo carregado
         # Este seletor espera por qualquer um dos textos indicativos ou o rodapé.
-        wait.until(
-            EC.presence_of_element_located((
-                By.XPATH, 
-                "//body[contains(.,'anúncio') or contains(.,'Nenhum anúncio') or contains(.,'Todos os formatos')] | //footer | //div[contains(text(), 'Anunciante verificado')]"
-            ))
-        )
+        wait.until(EC.presence_of_element_located((By.XPATH, GOOGLE_READY_XPATH)))
         logger.info("Indicador de carregamento da página detectado.")
-        time.sleep(10) # Espera adicional robusta para garantir que todos os scripts JS carreguem e anúncios sejam renderizados.
+        time.sleep(GOOGLE_RENDER_WAIT_SECONDS) # Espera adicional robusta para garantir que todos os scripts JS carreguem e anúncios sejam renderizados.
 
-        text = driver.find_element(By.TAG_NAME, 'body').text
-        logger.info(f"Extração do Google Ads Transparency concluída para: {domain}. Tamanho do texto: {len(text)} caracteres.")
-        if not text.strip() or len(text.strip()) < 200: # Aumentar o limite mínimo
-            logger.warning(f"Texto extraído do Google Ads Transparency para {domain} parece muito curto. HTML da página será retornado.")
-            page_html = driver.page_source
-            return f"Erro ao extrair: Conteúdo do corpo do texto muito curto. HTML (primeiros 2000 chars): {page_html[:2000]}"
-        return text
+        return _read_page_text(driver, "Google Ads Transparency", domain)
 
     except TimeoutException:
-        logger.error(f"Timeout ao esperar pelo conteúdo do Google Ads Transparency para {domain}", exc_info=True)
-        page_source_on_timeout = ""
-        body_text_on_timeout = ""
-        try:
-            if driver:
-                 page_source_on_timeout = driver.page_source
-                 body_text_on_timeout = driver.find_element(By.TAG_NAME, 'body').text
-                 if body_text_on_timeout and body_text_on_timeout.strip() and len(body_text_on_timeout.strip()) > 100:
-                     logger.warning(f"Conteúdo parcial do corpo extraído após timeout para {domain}. Tamanho: {len(body_text_on_timeout)}")
-                     return body_text_on_timeout
-                 logger.warning(f"Corpo do texto vazio ou muito curto no timeout, mas page_source tem {len(page_source_on_timeout)} caracteres.")
-                 return f"Erro ao extrair: Timeout. HTML no momento do timeout (primeiros 2000 chars): {page_source_on_timeout[:2000]}"
-        except Exception as inner_e:
-             logger.error(f"Erro ao tentar extrair conteúdo parcial após timeout para {domain}: {inner_e}")
-        return f"Erro ao extrair: Timeout esperando pelo conteúdo principal. Sem conteúdo recuperável."
+        return _recover_page_text_on_timeout(driver, "Google Ads Transparency", domain)
     except WebDriverException as e:
          logger.error(f"Erro do WebDriver ao extrair anúncios do Google para {domain}: {str(e)}", exc_info=True)
          return f"Erro ao extrair: Erro do WebDriver ({type(e).__name__}). Verifique a compatibilidade do ChromeDriver e do Chrome."
@@ -213,12 +287,101 @@ def extract_google_ads(domain):
         logger.error(f"Erro inesperado ao extrair anúncios do Google para {domain}: {str(e)}", exc_info=True)
         return f"Erro ao extrair: {str(e)}"
     finally:
-        if driver:
+        if driver and owns_driver:
+            driver.quit()
+
+def _extraction_error_message(e, plataforma, consulta):
+    """Converte uma exceção da extração na mensagem 'Erro ao extrair: ...' usada pelas verificações."""
+    from selenium.common.exceptions import WebDriverException
+
+    if isinstance(e, WebDriverException):
+        logger.error(f"Erro do WebDriver ao extrair anúncios do {plataforma} para {consulta}: {str(e)}", exc_info=True)
+        return f"Erro ao extrair: Erro do WebDriver ({type(e).__name__}). Verifique a compatibilidade do ChromeDriver e do Chrome."
+    logger.error(f"Erro inesperado ao extrair anúncios do {plataforma} para {consulta}: {str(e)}", exc_info=True)
+    return f"Erro ao extrair: {str(e)}"
+
+def _close_extra_tabs(driver, keep_handle):
+    """Fecha as abas abertas durante a extração para que um driver reutilizado volte a ter uma única aba."""
+    try:
+        for handle in driver.window_handles:
+            if handle != keep_handle:
+                driver.switch_to.window(handle)
+                driver.close()
+        driver.switch_to.window(keep_handle)
+    except Exception as e:
+        logger.warning(f"Erro ao fechar abas extras do Chrome reutilizado: {e}")
+
+def extract_ads_multitab(instagram_username, domain, driver=None):
+    """
+    Extrai Facebook Ads Library e Google Ads Transparency com um único Chrome, uma aba por plataforma.
+
+    A aba do Google é aberta (sem bloquear) antes da navegação do Facebook, então os carregamentos e as
+    esperas de renderização das duas páginas se sobrepõem. Retorna a tupla (conteudo_facebook, conteudo_google),
+    com as mesmas mensagens 'Erro ao extrair: ...' das funções de extração individuais.
+    Um `driver` informado é reutilizado e devolvido com uma única aba aberta.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    if not instagram_username or not domain:
+        return extract_facebook_ads(instagram_username, driver=driver), extract_google_ads(domain, driver=driver)
+    owns_driver = driver is None
+    fb_handle = None
+    fb_content = None
+    google_content = None
+    try:
+        fb_url = FACEBOOK_ADS_LIBRARY_URL.format(query=instagram_username)
+        google_url = GOOGLE_ADS_TRANSPARENCY_URL.format(query=domain)
+        logger.info(f"Acessando Facebook ({instagram_username}) e Google ({domain}) em abas paralelas de um único Chrome.")
+
+        if owns_driver:
+            driver = setup_selenium_driver(extra_arguments=BACKGROUND_TAB_ARGUMENTS)
+        fb_handle = driver.current_window_handle
+        driver.execute_script("window.open(arguments[0], '_blank');", google_url)
+        google_opened_at = time.monotonic()
+        google_handle = [handle for handle in driver.window_handles if handle != fb_handle][0]
+
+        try:
+            driver.switch_to.window(fb_handle)
+            driver.get(fb_url) # A aba do Google continua carregando enquanto esta navegação acontece
+            time.sleep(FB_RENDER_WAIT_SECONDS)
+            fb_content = _read_page_text(driver, "Facebook Ads Library", instagram_username)
+        except TimeoutException:
+            fb_content = _recover_page_text_on_timeout(driver, "Facebook Ads Library", instagram_username)
+        except Exception as e:
+            fb_content = _extraction_error_message(e, "Facebook", instagram_username)
+
+        try:
+            driver.switch_to.window(google_handle)
+            WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.XPATH, GOOGLE_READY_XPATH)))
+            logger.info("Indicador de carregamento da página do Google detectado.")
+            # Desconta o tempo que a aba já passou renderizando em segundo plano
+            remaining_wait = GOOGLE_RENDER_WAIT_SECONDS - (time.monotonic() - google_opened_at)
+            if remaining_wait > 0:
+                time.sleep(remaining_wait)
+            google_content = _read_page_text(driver, "Google Ads Transparency", domain)
+        except TimeoutException:
+            google_content = _recover_page_text_on_timeout(driver, "Google Ads Transparency", domain)
+        except Exception as e:
+            google_content = _extraction_error_message(e, "Google", domain)
+
+    except Exception as e:
+        error_message = _extraction_error_message(e, "Facebook/Google (multi-aba)", f"{instagram_username}/{domain}")
+        fb_content = fb_content if fb_content is not None else error_message
+        google_content = google_content if google_content is not None else error_message
+    finally:
+        if driver and owns_driver:
             driver.quit()
+        elif driver and fb_handle:
+            _close_extra_tabs(driver, fb_handle)
+    return fb_content, google_content
 
 # --- Função de Análise com API da OpenAI (Mantida da v1, com pequenos ajustes no prompt) ---
-def analyze_ads_with_openai_api(plataforma, conteudo, consulta):
-    global client
+def analyze_ads_with_openai_api(plataforma, conteudo, consulta, record=True):
+    # record=False não grava o veredito como rótulo de treino (ex.: relatório de avaliação do classificador local)
+    client = get_openai_client()
     if not client:
         logger.error("Cliente OpenAI não inicializado. Verifique a chave API OPENAI_API_KEY.")
         return False
@@ -282,8 +445,12 @@ def analyze_ads_with_openai_api(plataforma, conteudo, consulta):
         logger.info(f"Resultado da análise OpenAI API para {consulta} ({plataforma}): '{result}'")
         
         if result == "sim":
+            if record:
+                record_verdict(plataforma, consulta, conteudo, True, "openai")
             return True
         elif result == "não" or result == "nao":
+            if record:
+                record_verdict(plataforma, consulta, conteudo, False, "openai")
             return False
         else:
             logger.warning(f"Resposta inesperada da OpenAI API: '{result}'. Considerando como 'Não'. Prompt enviado: {prompt_text[:300]}...")
@@ -293,6 +460,40 @@ def analyze_ads_with_openai_api(plataforma, conteudo, consulta):
         logger.error(f"Erro durante a análise com OpenAI API para {consulta} ({plataforma}): {str(e)}", exc_info=True)
         return False
 
+def record_verdict(plataforma, consulta, conteudo, verdict, source, confidence=None):
+    """Registra o veredito no snapshot_store (rótulos de treino do classificador local). Falhas são apenas registradas no log."""
+    try:
+        snapshot_store.record_classification(plataforma, consulta, snapshot_store.content_hash(conteudo), verdict, source, confidence)
+    except Exception as e:
+        logger.error(f"Erro ao registrar veredito de {consulta} ({plataforma}): {str(e)}", exc_info=True)
+
+def classify_ads(plataforma, conteudo, consulta, results=None):
+    """
+    Decide se há anúncios ativos usando primeiro o classificador local e, só abaixo do limiar de
+    confiança, a OpenAI. Sem cliente OpenAI configurado, o veredito local é usado mesmo com confiança baixa.
+    Retorna None quando nenhum dos dois pode decidir (sem modelo local utilizável e sem cliente OpenAI).
+    Com `results`, cada chamada à OpenAI é contada em `results["openai_calls"]` (cota da watchlist).
+    """
+    if conteudo and "Erro ao extrair:" not in conteudo and len(conteudo.strip()) >= 150:
+        try:
+            prediction = ad_classifier.predict(plataforma, conteudo)
+        except Exception as e:
+            logger.error(f"Erro no classificador local para {consulta} ({plataforma}): {str(e)}", exc_info=True)
+            prediction = None
+        if prediction:
+            verdict, confidence = prediction
+            if confidence >= ad_classifier.AD_CLASSIFIER_THRESHOLD or not get_openai_client():
+                logger.info(f"Classificador local para {consulta} ({plataforma}): {'Sim' if verdict else 'Não'} (confiança {confidence:.2f}).")
+                record_verdict(plataforma, consulta, conteudo, verdict, "local", confidence)
+                return verdict
+            logger.info(f"Confiança do classificador local baixa ({confidence:.2f}) para {consulta} ({plataforma}). Consultando a OpenAI.")
+    if not get_openai_client():
+        logger.error(f"Sem classificador local utilizável e sem cliente OpenAI para {consulta} ({plataforma}). Análise não realizada.")
+        return None
+    if results is not None:
+        results["openai_calls"] = results.get("openai_calls", 0) + 1
+    return analyze_ads_with_openai_api(plataforma, conteudo, consulta)
+
 # --- Função de Verificação QSA (Mantida da v1) ---
 def consultar_qsa(cnpj):
     if not cnpj:
@@ -302,7 +503,7 @@ def consultar_qsa(cnpj):
         if len(cnpj_limpo) != 14:
              return {"error": "CNPJ inválido, deve conter 14 dígitos.", "success": False}
 
-        url = f"https://www.receitaws.com.br/v1/cnpj/{cnpj_limpo}"
+        url = RECEITAWS_URL.format(cnpj=cnpj_limpo)
         logger.info(f"Consultando QSA para CNPJ: {cnpj_limpo} na URL: {url}")
 
         max_retries = 2 
@@ -376,8 +577,35 @@ def consultar_qsa(cnpj):
         logger.error(f"Erro inesperado ao consultar QSA para CNPJ {cnpj}: {str(e)}", exc_info=True)
         return {"error": f"Erro inesperado no servidor ao processar CNPJ: {str(e)}", "success": False}
 
+# --- Snapshots das Páginas Raspadas ---
+def store_page_snapshot(plataforma, consulta, conteudo):
+    """Guarda o texto raspado no snapshot_store para reclassificação futura. Falhas são apenas registradas no log."""
+    try:
+        return snapshot_store.save_snapshot(plataforma, consulta, conteudo)
+    except Exception as e:
+        logger.error(f"Erro ao salvar snapshot de {consulta} ({plataforma}): {str(e)}", exc_info=True)
+        return None
+
+def _reusable_ads_status(previous_results, status_key, hash_key, current_hash):
+    """Retorna a classificação anterior se a página raspada não mudou desde então (mesmo hash), senão None."""
+    if not previous_results or not current_hash:
+        return None
+    if previous_results.get(hash_key) != current_hash:
+        return None
+    previous_status = previous_results.get(status_key)
+    return previous_status if previous_status in ("active", "inactive") else None
+
 # --- Função Principal de Verificações (V2) ---
-def run_verification_tasks(instagram_username, domain, cnpj):
+def run_verification_tasks(instagram_username, domain, cnpj, multi_tab=None, previous_results=None, driver=None):
+    """
+    Executa as verificações de Facebook Ads, Google Ads e QSA para os identificadores fornecidos.
+
+    Com `previous_results` (resultado de uma execução anterior), páginas cujo conteúdo não mudou
+    reaproveitam a classificação anterior em vez de chamar a OpenAI novamente. Com `driver`, as
+    extrações usam esse Chrome em vez de abrir um novo (ex.: um Chrome fixo por worker).
+    """
+    if multi_tab is None:
+        multi_tab = SELENIUM_MULTI_TAB
     results = {
         "instagram_username": instagram_username,
         "domain": domain,
@@ -388,12 +616,23 @@ def run_verification_tasks(instagram_username, domain, cnpj):
         "qsa_data": None,                   
         "error_messages": [],
         "raw_fb_content_preview": "",
-        "raw_google_content_preview": ""
+        "raw_google_content_preview": "",
+        "fb_content_hash": None,
+        "google_content_hash": None,
+        "reused_classifications": [],
+        "openai_calls": 0
     }
 
+    fb_content = None
+    google_content = None
+    if multi_tab and instagram_username and domain:
+        logger.info(f"Iniciando extração multi-aba para: {instagram_username} / {domain}")
+        fb_content, google_content = extract_ads_multitab(instagram_username, domain, driver=driver)
+
     if instagram_username:
         logger.info(f"Iniciando verificação Facebook Ads para: {instagram_username}")
-        fb_content = extract_facebook_ads(instagram_username)
+        if fb_content is None:
+            fb_content = extract_facebook_ads(instagram_username, driver=driver)
         results["raw_fb_content_preview"] = fb_content[:1000] + ("... (truncado)" if len(fb_content) > 1000 else "")
         if "Erro ao extrair:" in fb_content or not fb_content.strip():
             results["facebook_ads_status"] = "error"
@@ -401,16 +640,29 @@ def run_verification_tasks(instagram_username, domain, cnpj):
             results["error_messages"].append(f"Facebook Ads: {error_msg}")
             logger.error(f"Erro na extração do Facebook Ads para {instagram_username}: {error_msg}")
         else:
-            logger.info(f"Conteúdo do Facebook Ads extraído para {instagram_username}, enviando para análise OpenAI.")
-            has_fb_ads = analyze_ads_with_openai_api("facebook", fb_content, instagram_username)
-            results["facebook_ads_status"] = "active" if has_fb_ads else "inactive"
+            results["fb_content_hash"] = snapshot_store.content_hash(fb_content)
+            store_page_snapshot("facebook", instagram_username, fb_content)
+            previous_status = _reusable_ads_status(previous_results, "facebook_ads_status", "fb_content_hash", results["fb_content_hash"])
+            if previous_status:
+                logger.info(f"Conteúdo do Facebook Ads para {instagram_username} não mudou desde a última verificação, reaproveitando a classificação.")
+                results["facebook_ads_status"] = previous_status
+                results["reused_classifications"].append("facebook")
+            else:
+                logger.info(f"Conteúdo do Facebook Ads extraído para {instagram_username}, enviando para análise.")
+                has_fb_ads = classify_ads("facebook", fb_content, instagram_username, results)
+                if has_fb_ads is None:
+                    results["facebook_ads_status"] = "error"
+                    results["error_messages"].append("Facebook Ads: Nenhum classificador disponível (modelo local ou OpenAI).")
+                else:
+                    results["facebook_ads_status"] = "active" if has_fb_ads else "inactive"
         logger.info(f"Resultado Facebook Ads para {instagram_username}: {results['facebook_ads_status']}")
     else:
         results["facebook_ads_status"] = "not_provided"
 
     if domain:
         logger.info(f"Iniciando verificação Google Ads para: {domain}")
-        google_content = extract_google_ads(domain)
+        if google_content is None:
+            google_content = extract_google_ads(domain, driver=driver)
         results["raw_google_content_preview"] = google_content[:1000] + ("... (truncado)" if len(google_content) > 1000 else "")
         if "Erro ao extrair:" in google_content or not google_content.strip():
             results["google_ads_status"] = "error"
@@ -418,9 +670,21 @@ def run_verification_tasks(instagram_username, domain, cnpj):
             results["error_messages"].append(f"Google Ads: {error_msg}")
             logger.error(f"Erro na extração do Google Ads para {domain}: {error_msg}")
         else:
-            logger.info(f"Conteúdo do Google Ads extraído para {domain}, enviando para análise OpenAI.")
-            has_google_ads = analyze_ads_with_openai_api("google", google_content, domain)
-            results["google_ads_status"] = "active" if has_google_ads else "inactive"
+            results["google_content_hash"] = snapshot_store.content_hash(google_content)
+            store_page_snapshot("google", domain, google_content)
+            previous_status = _reusable_ads_status(previous_results, "google_ads_status", "google_content_hash", results["google_content_hash"])
+            if previous_status:
+                logger.info(f"Conteúdo do Google Ads para {domain} não mudou desde a última verificação, reaproveitando a classificação.")
+                results["google_ads_status"] = previous_status
+                results["reused_classifications"].append("google")
+            else:
+                logger.info(f"Conteúdo do Google Ads extraído para {domain}, enviando para análise.")
+                has_google_ads = classify_ads("google", google_content, domain, results)
+                if has_google_ads is None:
+                    results["google_ads_status"] = "error"
+                    results["error_messages"].append("Google Ads: Nenhum classificador disponível (modelo local ou OpenAI).")
+                else:
+                    results["google_ads_status"] = "active" if has_google_ads else "inactive"
         logger.info(f"Resultado Google Ads para {domain}: {results['google_ads_status']}")
     else:
         results["google_ads_status"] = "not_provided"
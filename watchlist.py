@@ -0,0 +1,437 @@
+"""
+Watchlist de leads em "acompanhar": reverificação periódica e incremental.
+
+Cada lead acompanhado guarda o último resultado das verificações e quando cada uma foi feita.
+Em cada ciclo (apenas dentro da janela fora de pico), só são refeitas as verificações cujo cache
+expirou, e só são reclassificadas as páginas cujo hash de conteúdo mudou. As cotas da ReceitaWS e
+da OpenAI são respeitadas, e mudanças de status de anúncios ou de qualificação ficam registradas.
+Leads que saem das faixas "acompanhar" (viram comprar ou descartar) deixam de ser acompanhados.
+
+Uso:
+    python watchlist.py add --instagram usuario --domain empresa.com.br --cnpj 00000000000000
+    python watchlist.py run            # laço contínuo
+    python watchlist.py run-once --force
+    python watchlist.py changes
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+import lead_history
+from scoring import calculate_score, determine_qualification
+from verifications_streamlit import run_verification_tasks
+
+logger = logging.getLogger(__name__)
+
+WATCHLIST_DB_PATH = os.getenv("WATCHLIST_DB_PATH", "watchlist.db")
+WATCHLIST_INTERVAL_HOURS = float(os.getenv("WATCHLIST_INTERVAL_HOURS", "24"))
+# Validade do cache de cada verificação: dados de CNPJ mudam bem menos que anúncios
+WATCHLIST_ADS_TTL_HOURS = float(os.getenv("WATCHLIST_ADS_TTL_HOURS", "24"))
+WATCHLIST_QSA_TTL_HOURS = float(os.getenv("WATCHLIST_QSA_TTL_HOURS", str(24 * 30)))
+# Janela fora de pico no formato HH:MM-HH:MM (pode virar a meia-noite). Vazio = sempre.
+WATCHLIST_WINDOW = os.getenv("WATCHLIST_WINDOW", "22:00-06:00")
+WATCHLIST_POLL_SECONDS = float(os.getenv("WATCHLIST_POLL_SECONDS", "300"))
+# Cotas: a API pública da ReceitaWS permite 3 consultas por minuto
+RECEITAWS_MAX_PER_MINUTE = int(os.getenv("RECEITAWS_MAX_PER_MINUTE", "3"))
+OPENAI_MAX_PER_HOUR = int(os.getenv("OPENAI_MAX_PER_HOUR", "200"))
+# Desativa leads cuja reverificação os tira de TRACKED_STATUSES (false = continuar reverificando)
+WATCHLIST_DEACTIVATE_UNTRACKED = os.getenv("WATCHLIST_DEACTIVATE_UNTRACKED", "true").lower() in ("1", "true", "sim", "yes")
+
+TRACKED_STATUSES = ("acompanhar_alto", "acompanhar_baixo")
+_ADS_RESULT_KEYS = ("facebook_ads_status", "google_ads_status", "raw_fb_content_preview",
+                    "raw_google_content_preview", "fb_content_hash", "google_content_hash")
+_QSA_RESULT_KEYS = ("qsa_status", "qsa_data")
+
+_write_lock = threading.Lock()
+_initialized_paths = set()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    instagram_username TEXT NOT NULL DEFAULT '',
+    domain TEXT NOT NULL DEFAULT '',
+    cnpj TEXT NOT NULL DEFAULT '',
+    checklist TEXT NOT NULL DEFAULT '{}',
+    valor_inicial REAL,
+    valor_atual REAL,
+    interval_hours REAL NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL,
+    next_check_at REAL NOT NULL,
+    last_checked_at REAL,
+    ads_checked_at REAL,
+    qsa_checked_at REAL,
+    verification_results TEXT,
+    score INTEGER,
+    qualification_status TEXT,
+    UNIQUE (instagram_username, domain, cnpj)
+);
+CREATE INDEX IF NOT EXISTS idx_watchlist_due ON watchlist(active, next_check_at);
+CREATE TABLE IF NOT EXISTS watchlist_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    watch_id INTEGER NOT NULL REFERENCES watchlist(id),
+    detected_at REAL NOT NULL,
+    field TEXT NOT NULL,
+    old_value TEXT,
+    new_value TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_watchlist_changes_detected_at ON watchlist_changes(detected_at);
+"""
+
+
+class RateBudget:
+    """Cota de chamadas em janela deslizante (ex.: 3 por 60s), com reserva antecipada e devolução."""
+
+    def __init__(self, max_calls, period_seconds):
+        self.max_calls = max_calls
+        self.period_seconds = period_seconds
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._calls and now - self._calls[0] >= self.period_seconds:
+            self._calls.popleft()
+
+    def available(self):
+        with self._lock:
+            self._expire(time.time())
+            return max(self.max_calls - len(self._calls), 0)
+
+    def try_acquire(self, amount=1):
+        if amount <= 0:
+            return True
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            if len(self._calls) + amount > self.max_calls:
+                return False
+            self._calls.extend([now] * amount)
+            return True
+
+    def release(self, amount=1):
+        """Devolve chamadas reservadas que não chegaram a ser feitas."""
+        with self._lock:
+            for _ in range(min(amount, len(self._calls))):
+                self._calls.pop()
+
+
+receitaws_budget = RateBudget(RECEITAWS_MAX_PER_MINUTE, 60)
+openai_budget = RateBudget(OPENAI_MAX_PER_HOUR, 3600)
+
+
+def _connect(db_path=None):
+    path = db_path or WATCHLIST_DB_PATH
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if path not in _initialized_paths:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _initialized_paths.add(path)
+    return conn
+
+
+def _row_to_dict(row):
+    item = dict(row)
+    item["checklist"] = json.loads(item["checklist"] or "{}")
+    item["verification_results"] = json.loads(item["verification_results"]) if item["verification_results"] else None
+    return item
+
+
+def in_off_peak_window(now=None, window=None):
+    """Indica se o horário local está dentro da janela fora de pico configurada."""
+    window = WATCHLIST_WINDOW if window is None else window
+    if not window:
+        return True
+    start_text, end_text = window.split("-")
+    moment = datetime.fromtimestamp(now or time.time())
+    minutes = moment.hour * 60 + moment.minute
+    start = int(start_text[:2]) * 60 + int(start_text[3:5])
+    end = int(end_text[:2]) * 60 + int(end_text[3:5])
+    if start <= end:
+        return start <= minutes < end
+    return minutes >= start or minutes < end
+
+
+def add_lead(instagram_username=None, domain=None, cnpj=None, checklist=None, valor_inicial=None, valor_atual=None,
+             verification_results=None, score=None, qualification_status=None, interval_hours=None,
+             checked_at=None, db_path=None):
+    """
+    Adiciona (ou atualiza) um lead na watchlist e retorna seu id.
+
+    Se `verification_results` for informado, ele vira o cache inicial e a primeira reverificação fica para
+    daqui a `interval_hours`.
+    """
+    instagram_username = lead_history.normalize_instagram(instagram_username) or ""
+    domain = lead_history.normalize_domain(domain) or ""
+    cnpj = lead_history.normalize_cnpj(cnpj) or ""
+    if not (instagram_username or domain or cnpj):
+        raise ValueError("Informe pelo menos um Instagram, domínio ou CNPJ para acompanhar.")
+    interval_hours = interval_hours or WATCHLIST_INTERVAL_HOURS
+    now = time.time()
+    checked_at = checked_at or now
+    ads_checked_at = qsa_checked_at = None
+    if verification_results:
+        if verification_results.get("facebook_ads_status") != "error" and verification_results.get("google_ads_status") != "error":
+            ads_checked_at = checked_at
+        if verification_results.get("qsa_status") in ("found", "not_found"):
+            qsa_checked_at = checked_at
+    next_check_at = checked_at + interval_hours * 3600 if verification_results else now
+
+    with _write_lock:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO watchlist (instagram_username, domain, cnpj, checklist, valor_inicial, valor_atual, interval_hours, "
+                    "created_at, next_check_at, last_checked_at, ads_checked_at, qsa_checked_at, verification_results, score, qualification_status) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (instagram_username, domain, cnpj) DO UPDATE SET "
+                    "checklist = excluded.checklist, valor_inicial = excluded.valor_inicial, valor_atual = excluded.valor_atual, "
+                    "interval_hours = excluded.interval_hours, active = 1, next_check_at = excluded.next_check_at, "
+                    "last_checked_at = COALESCE(excluded.last_checked_at, last_checked_at), "
+                    "ads_checked_at = COALESCE(excluded.ads_checked_at, ads_checked_at), "
+                    "qsa_checked_at = COALESCE(excluded.qsa_checked_at, qsa_checked_at), "
+                    "verification_results = COALESCE(excluded.verification_results, verification_results), "
+                    "score = COALESCE(excluded.score, score), "
+                    "qualification_status = COALESCE(excluded.qualification_status, qualification_status)",
+                    (instagram_username, domain, cnpj, json.dumps(checklist or {}, ensure_ascii=False), valor_inicial, valor_atual,
+                     interval_hours, now, next_check_at, checked_at if verification_results else None, ads_checked_at, qsa_checked_at,
+                     json.dumps(verification_results, ensure_ascii=False, default=str) if verification_results else None,
+                     score, qualification_status)
+                )
+                watch_id = conn.execute(
+                    "SELECT id FROM watchlist WHERE instagram_username = ? AND domain = ? AND cnpj = ?",
+                    (instagram_username, domain, cnpj)
+                ).fetchone()["id"]
+        finally:
+            conn.close()
+    logger.info(f"Lead {watch_id} adicionado à watchlist ({instagram_username or '-'} / {domain or '-'} / {cnpj or '-'}).")
+    return watch_id
+
+
+def remove_lead(watch_id, db_path=None):
+    with _write_lock:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                conn.execute("UPDATE watchlist SET active = 0 WHERE id = ?", (watch_id,))
+        finally:
+            conn.close()
+
+
+def list_leads(active_only=True, db_path=None):
+    conn = _connect(db_path)
+    try:
+        where = "WHERE active = 1" if active_only else ""
+        rows = conn.execute(f"SELECT * FROM watchlist {where} ORDER BY next_check_at").fetchall()
+    finally:
+        conn.close()
+    return [_row_to_dict(row) for row in rows]
+
+
+def list_changes(since=None, limit=100, db_path=None):
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT c.*, w.instagram_username, w.domain, w.cnpj FROM watchlist_changes c JOIN watchlist w ON w.id = c.watch_id "
+            "WHERE c.detected_at >= ? ORDER BY c.detected_at DESC LIMIT ?",
+            (since or 0, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+
+def _expired_checks(item, now):
+    """Decide quais verificações precisam ser refeitas: as que nunca rodaram, deram erro ou cujo cache expirou."""
+    cached = item["verification_results"] or {}
+    has_ads_identifier = bool(item["instagram_username"] or item["domain"])
+    ads_error = "error" in (cached.get("facebook_ads_status"), cached.get("google_ads_status"))
+    ads_expired = has_ads_identifier and (
+        not item["ads_checked_at"] or ads_error or now - item["ads_checked_at"] >= WATCHLIST_ADS_TTL_HOURS * 3600
+    )
+    qsa_expired = bool(item["cnpj"]) and (
+        not item["qsa_checked_at"] or cached.get("qsa_status") not in ("found", "not_found") or now - item["qsa_checked_at"] >= WATCHLIST_QSA_TTL_HOURS * 3600
+    )
+    return ads_expired, qsa_expired
+
+
+def _merge_results(cached, fresh, ads_refreshed, qsa_refreshed):
+    merged = dict(cached or {})
+    for key in ("instagram_username", "domain", "cnpj"):
+        merged[key] = fresh.get(key) or merged.get(key)
+    if ads_refreshed:
+        for key in _ADS_RESULT_KEYS:
+            merged[key] = fresh.get(key)
+    if qsa_refreshed:
+        for key in _QSA_RESULT_KEYS:
+            merged[key] = fresh.get(key)
+    merged["error_messages"] = fresh.get("error_messages", [])
+    return merged
+
+
+def recheck_lead(item, now=None, db_path=None):
+    """
+    Reverifica um lead da watchlist de forma incremental e retorna a lista de mudanças detectadas,
+    ou None se a verificação foi adiada por falta de cota.
+    """
+    now = now or time.time()
+    cached = item["verification_results"] or {}
+    ads_expired, qsa_expired = _expired_checks(item, now)
+
+    openai_needed = (1 if item["instagram_username"] else 0) + (1 if item["domain"] else 0) if ads_expired else 0
+    receitaws_needed = 1 if qsa_expired else 0
+    if not openai_budget.try_acquire(openai_needed):
+        logger.info(f"Cota da OpenAI insuficiente para o lead {item['id']} da watchlist. Reverificação adiada.")
+        return None
+    if not receitaws_budget.try_acquire(receitaws_needed):
+        openai_budget.release(openai_needed)
+        logger.info(f"Cota da ReceitaWS insuficiente para o lead {item['id']} da watchlist. Reverificação adiada.")
+        return None
+
+    if ads_expired or qsa_expired:
+        logger.info(f"Reverificando lead {item['id']} da watchlist (anúncios: {ads_expired}, CNPJ: {qsa_expired}).")
+        fresh = run_verification_tasks(
+            item["instagram_username"] if ads_expired else None,
+            item["domain"] if ads_expired else None,
+            item["cnpj"] if qsa_expired else None,
+            previous_results=cached
+        )
+        # Devolve a cota das páginas que não chegaram à OpenAI (conteúdo inalterado, classificador local ou erro de extração)
+        openai_budget.release(openai_needed - fresh.get("openai_calls", 0))
+        results = _merge_results(cached, fresh, ads_expired, qsa_expired)
+    else:
+        logger.info(f"Cache do lead {item['id']} da watchlist ainda válido. Nenhuma verificação refeita.")
+        results = cached
+
+    score = calculate_score(item["checklist"], results)
+    qualification = determine_qualification(score, item["valor_inicial"], item["valor_atual"])
+
+    changes = []
+    if item["verification_results"]:
+        for field in ("facebook_ads_status", "google_ads_status", "qsa_status"):
+            if cached.get(field) != results.get(field):
+                changes.append((field, cached.get(field), results.get(field)))
+    if item["qualification_status"] and item["qualification_status"] != qualification["status"]:
+        changes.append(("qualification_status", item["qualification_status"], qualification["status"]))
+    active = 0 if WATCHLIST_DEACTIVATE_UNTRACKED and qualification["status"] not in TRACKED_STATUSES else 1
+
+    with _write_lock:
+        conn = _connect(db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE watchlist SET next_check_at = ?, last_checked_at = ?, ads_checked_at = ?, qsa_checked_at = ?, "
+                    "verification_results = ?, score = ?, qualification_status = ?, active = ? WHERE id = ?",
+                    (now + item["interval_hours"] * 3600, now,
+                     now if ads_expired else item["ads_checked_at"],
+                     now if qsa_expired else item["qsa_checked_at"],
+                     json.dumps(results, ensure_ascii=False, default=str), score, qualification["status"], active, item["id"])
+                )
+                conn.executemany(
+                    "INSERT INTO watchlist_changes (watch_id, detected_at, field, old_value, new_value) VALUES (?, ?, ?, ?, ?)",
+                    [(item["id"], now, field, old, new) for field, old, new in changes]
+                )
+        finally:
+            conn.close()
+
+    if ads_expired or qsa_expired:
+        try:
+            lead_history.save_analysis(item["instagram_username"], item["domain"], item["cnpj"], item["checklist"], results,
+                                       score, qualification, valor_inicial=item["valor_inicial"], valor_atual=item["valor_atual"])
+        except Exception as e_history:
+            logger.error(f"Erro ao gravar reverificação da watchlist no histórico: {e_history}", exc_info=True)
+
+    for field, old, new in changes:
+        logger.warning(f"Mudança detectada no lead {item['id']} da watchlist: {field} {old} -> {new}")
+    if not active:
+        logger.info(f"Lead {item['id']} saiu de 'acompanhar' ({qualification['status']}) e foi removido da watchlist.")
+    return [{"watch_id": item["id"], "field": field, "old_value": old, "new_value": new} for field, old, new in changes]
+
+
+def run_cycle(now=None, max_leads=None, force=False, db_path=None):
+    """Reverifica os leads vencidos da watchlist (apenas na janela fora de pico, a menos que `force`). Retorna as mudanças."""
+    now = now or time.time()
+    if not force and not in_off_peak_window(now):
+        logger.info("Fora da janela fora de pico da watchlist. Nenhuma reverificação executada.")
+        return []
+    conn = _connect(db_path)
+    try:
+        sql = "SELECT * FROM watchlist WHERE active = 1 AND next_check_at <= ? ORDER BY next_check_at"
+        params = [now]
+        if max_leads:
+            sql += " LIMIT ?"
+            params.append(int(max_leads))
+        due = [_row_to_dict(row) for row in conn.execute(sql, params).fetchall()]
+    finally:
+        conn.close()
+
+    logger.info(f"Ciclo da watchlist: {len(due)} leads vencidos.")
+    changes = []
+    for item in due:
+        try:
+            lead_changes = recheck_lead(item, now=now, db_path=db_path)
+        except Exception as e:
+            logger.error(f"Erro ao reverificar lead {item['id']} da watchlist: {e}", exc_info=True)
+            continue
+        if lead_changes is None:
+            # Sem cota agora: os próximos leads também ficariam sem, então o restante fica para o próximo ciclo
+            break
+        changes.extend(lead_changes)
+    return changes
+
+
+def run_forever(poll_seconds=None, db_path=None):
+    poll_seconds = poll_seconds or WATCHLIST_POLL_SECONDS
+    logger.info(f"Agendador da watchlist iniciado (janela: {WATCHLIST_WINDOW or 'sempre'}, intervalo de checagem: {poll_seconds}s).")
+    while True:
+        run_cycle(db_path=db_path)
+        time.sleep(poll_seconds)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Watchlist de reverificação de leads em 'acompanhar'.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add_parser = sub.add_parser("add", help="Adiciona um lead à watchlist.")
+    add_parser.add_argument("--instagram")
+    add_parser.add_argument("--domain")
+    add_parser.add_argument("--cnpj")
+    add_parser.add_argument("--checklist", default="{}", help="Checklist em JSON (chaves de CRITERIA_POINTS).")
+    add_parser.add_argument("--valor-inicial", type=float)
+    add_parser.add_argument("--valor-atual", type=float)
+    add_parser.add_argument("--interval-hours", type=float)
+    remove_parser = sub.add_parser("remove", help="Para de acompanhar um lead.")
+    remove_parser.add_argument("watch_id", type=int)
+    sub.add_parser("list", help="Lista os leads acompanhados.")
+    changes_parser = sub.add_parser("changes", help="Lista as mudanças detectadas.")
+    changes_parser.add_argument("--limit", type=int, default=100)
+    once_parser = sub.add_parser("run-once", help="Executa um único ciclo.")
+    once_parser.add_argument("--force", action="store_true", help="Ignora a janela fora de pico.")
+    once_parser.add_argument("--max-leads", type=int)
+    run_parser = sub.add_parser("run", help="Executa o agendador continuamente.")
+    run_parser.add_argument("--poll-seconds", type=float)
+    args = parser.parse_args()
+
+    if args.command == "add":
+        print(add_lead(args.instagram, args.domain, args.cnpj, checklist=json.loads(args.checklist),
+                       valor_inicial=args.valor_inicial, valor_atual=args.valor_atual, interval_hours=args.interval_hours))
+    elif args.command == "remove":
+        remove_lead(args.watch_id)
+    elif args.command == "list":
+        for lead in list_leads():
+            lead.pop("verification_results")
+            print(json.dumps(lead, ensure_ascii=False))
+    elif args.command == "changes":
+        print(json.dumps(list_changes(limit=args.limit), indent=2, ensure_ascii=False))
+    elif args.command == "run-once":
+        print(json.dumps(run_cycle(max_leads=args.max_leads, force=args.force), indent=2, ensure_ascii=False))
+    else:
+        run_forever(poll_seconds=args.poll_seconds)